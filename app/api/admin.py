@@ -1,6 +1,6 @@
 import os
 import uuid
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
 from sqlalchemy.orm import Session
 from app.database import get_db
@@ -9,9 +9,12 @@ from app.models.document import Document
 from app.schemas.user import User as UserSchema, UserUpdate
 from app.schemas.document import Document as DocumentSchema, DocumentResponse, DocumentStatus
 from app.core.dependencies import get_admin_user
-from app.services.document_store import DocumentStore
+from app.services.document_store import get_document_store
 from app.services.document_processor import queue_document_processing, get_document_processing_status
+from app.services.llm_warmup import get_model_warmer
+from app.services.ollama_pool import get_ollama_pool
 from app.utils.helpers import validate_file_extension, validate_file_size, get_file_type
+from app.utils.metrics import metrics
 from app.config import settings
 import logging
 
@@ -19,9 +22,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-# Initialize document store
-document_store = DocumentStore(settings.OUTPUT_FOLDER)
-
 @router.get("/users", response_model=List[UserSchema])
 def get_all_users(
     admin_user: User = Depends(get_admin_user),
@@ -138,7 +138,7 @@ async def upload_document(
         logger.info(f"Document record created in database: {document_id}")
         
         # Add to document store metadata (non-blocking)
-        await document_store.add_document(document_id, file.filename)
+        await get_document_store().add_document(document_id, file.filename)
         
         queue_document_processing(document_id, temp_file_path, priority=1)
         
@@ -243,7 +243,7 @@ def delete_document(
     
     try:
         # Delete from FAISS store
-        document_store.delete_document(document_id)
+        get_document_store().delete_document(document_id)
         
         # Delete file from filesystem
         if os.path.exists(document.file_path):
@@ -265,6 +265,47 @@ def delete_document(
             detail=f"Error deleting document: {str(e)}"
         )
 
+@router.post("/knowledge-base/migrate-index")
+def migrate_knowledge_base_index(
+    index_type: Optional[str] = None,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Convert the FAISS index to another type (flat, ivf_flat, hnsw, ivf_pq) without re-embedding; rebuilds keep it (admin only)"""
+    try:
+        result = get_document_store().migrate_index(index_type)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error migrating index: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error migrating index: {str(e)}"
+        )
+    
+    logger.info(f"Index migrated to {result['index_type']} by admin {admin_user.username}")
+    return result
+
+@router.post("/knowledge-base/rebuild-index")
+def rebuild_knowledge_base_index(
+    reembed: bool = False,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Rebuild and compact the FAISS index from stored embeddings, optionally re-embedding all text (admin only)"""
+    try:
+        result = get_document_store().rebuild_index(reembed=reembed)
+    except Exception as e:
+        logger.error(f"Error rebuilding index: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error rebuilding index: {str(e)}"
+        )
+    
+    logger.info(f"Index rebuilt by admin {admin_user.username} (reembed={result['reembedded']})")
+    return result
+
 @router.get("/system/status")
 def get_system_status(
     admin_user: User = Depends(get_admin_user)
@@ -292,5 +333,8 @@ def get_system_status(
             "web_workers": settings.WORKERS,
             "doc_processing_workers": settings.DOC_PROCESSING_WORKERS,
             "max_concurrent_connections": settings.MAX_CONCURRENT_CONNECTIONS
-        }
+        },
+        "ollama_backends": get_ollama_pool().status(),
+        "llm_warmup": get_model_warmer().status(),
+        "metrics": metrics.snapshot()
     }
\ No newline at end of file
@@ -1,7 +1,8 @@
 import json
 import uuid
 import asyncio
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from app.database import get_db
@@ -14,10 +15,22 @@ from app.schemas.chat import (
     ChatSessionCreate
 )
 from app.core.dependencies import get_current_active_user
-from app.services.chat_service import ChatService
-from app.services.document_store import DocumentStore
+from app.services.answer_cache import AnswerCache, replay_answer
+from app.services.chat_service import ChatService, recent_turns_cache
+from app.services.chunk_store import ChunkFilter
+from app.services.llm_scheduler import Overloaded, RateLimited, llm_scheduler
+from app.services.ollama_pool import is_backend_failure
+from app.services.stream_writer import STREAM_FORMAT_JSON, STREAM_FORMATS, TokenStreamWriter, encode_frame
+from app.services.conversation_memory import ConversationMemory
+from app.services.prompt_packer import hit_tokens, pack_context, prompt_budget
+from app.services.prompt_templates import (
+    NO_ANSWER_RESPONSE, build_messages, excerpts_answer, question_message, static_prompt_tokens
+)
+from app.services.token_counter import count_tokens
+from app.services.document_store import get_document_store, read_knowledge_base_status
 from app.core.security import verify_token
 from app.utils.helpers import Timer
+from app.utils.metrics import metrics
 from app.config import settings
 import logging
 
@@ -25,10 +38,79 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-document_store = DocumentStore(settings.OUTPUT_FOLDER)
 llm_model = LLMModel()
+answer_cache = AnswerCache(
+    max_size=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    threshold=settings.ANSWER_CACHE_THRESHOLD
+)
 active_connections = {}
 
+def _is_cancel_message(data: str) -> bool:
+    try:
+        message = json.loads(data)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(message, dict) and message.get("type") == "cancel"
+
+async def _run_cancellable(coro, cancel_event: asyncio.Event):
+    """Run coro until it finishes or cancel_event is set, returning (result, cancelled)"""
+    task = asyncio.create_task(coro)
+    waiter = asyncio.create_task(cancel_event.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+    if task.done():
+        return task.result(), False
+    
+    # Cancelling closes the HTTP stream, which makes Ollama stop generating and free the slot
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return None, True
+
+async def _with_first_token_deadline(coro, stream_writer: TokenStreamWriter, timeout: float):
+    """Run coro, giving up with Overloaded if it has streamed nothing after timeout seconds (0 waits forever)"""
+    task = asyncio.create_task(coro)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout or None)
+        if not done and not stream_writer.text:
+            raise Overloaded(f"No response from the LLM within {timeout:.0f} seconds")
+        return await task
+    finally:
+        if not task.done():
+            task.cancel()
+
+def _parse_chunk_filter(init_message: dict) -> Optional[ChunkFilter]:
+    """Build a search scope from the optional document_ids, file_types and uploaded_after/before init fields"""
+    def string_list(name):
+        value = init_message.get(name)
+        if value is None:
+            return None
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValueError(f"'{name}' must be a list of strings")
+        return tuple(value)
+    
+    def timestamp(name):
+        value = init_message.get(name)
+        if value is None:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{name}' must be an ISO 8601 date or datetime")
+    
+    chunk_filter = ChunkFilter(
+        document_ids=string_list("document_ids"),
+        file_types=string_list("file_types"),
+        uploaded_after=timestamp("uploaded_after"),
+        uploaded_before=timestamp("uploaded_before")
+    )
+    return None if chunk_filter.is_empty() else chunk_filter
+
 @router.post("/sessions", response_model=ChatSessionSchema)
 def create_chat_session(
     session_data: ChatSessionCreate,
@@ -36,7 +118,7 @@ def create_chat_session(
     db: Session = Depends(get_db)
 ):
     """Create a new chat session for unified knowledge base"""
-    chat_service = ChatService(db, document_store)
+    chat_service = ChatService(db)
     session = chat_service.create_session(
         current_user.id, 
         "unified_kb",
@@ -50,7 +132,7 @@ def get_user_sessions(
     db: Session = Depends(get_db)
 ):
     """Get all chat sessions for current user"""
-    chat_service = ChatService(db, document_store)
+    chat_service = ChatService(db)
     sessions = chat_service.get_user_sessions(current_user.id)
     return [ChatSessionSchema.from_orm(session) for session in sessions]
 
@@ -61,7 +143,7 @@ def get_session_messages(
     db: Session = Depends(get_db)
 ):
     """Get all messages for a chat session"""
-    chat_service = ChatService(db, document_store)
+    chat_service = ChatService(db)
     messages = chat_service.get_session_messages(session_id, current_user.id)
     return [ChatMessageSchema.from_orm(message) for message in messages]
 
@@ -83,14 +165,16 @@ def delete_session(
             detail="Session not found"
         )
     
+    session_pk = session.id
     db.delete(session)
     db.commit()
+    recent_turns_cache.discard(session_pk)
     return {"message": "Session deleted successfully"}
 
 @router.get("/knowledge-base/status")
 def get_knowledge_base_status():
     """Get unified knowledge base status"""
-    return document_store.get_knowledge_base_status()
+    return read_knowledge_base_status()
 
 @router.websocket("/ws/{token}")
 async def websocket_endpoint(websocket: WebSocket, token: str):
@@ -98,7 +182,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
     
     username = verify_token(token)
     if not username:
-        await websocket.send_text(json.dumps({
+        await websocket.send_text(encode_frame({
             "status": "error",
             "error": "Invalid token"
         }))
@@ -109,7 +193,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
     try:
         user = db.query(User).filter(User.username == username).first()
         if not user or not user.is_active:
-            await websocket.send_text(json.dumps({
+            await websocket.send_text(encode_frame({
                 "status": "error",
                 "error": "User not found or inactive"
             }))
@@ -118,10 +202,17 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
         
         session_id = None
         is_initialized = False
-        chat_history = []
+        memory = ConversationMemory(
+            llm_model,
+            recent_turns=settings.CHAT_MEMORY_RECENT_TURNS,
+            token_budget=settings.CHAT_MEMORY_TOKEN_BUDGET,
+            summary_tokens=settings.CHAT_MEMORY_SUMMARY_TOKENS
+        )
+        reader_task = None
+        question_cancel: Optional[asyncio.Event] = None
         client_id = str(uuid.uuid4())
         
-        chat_service = ChatService(db, document_store)
+        chat_service = ChatService(db)
         
         try:
             logger.info("Waiting for initialization message...")
@@ -131,7 +222,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                 logger.info(f"Received init data: {init_data}")
                 
                 if not init_data or init_data.strip() == "":
-                    await websocket.send_text(json.dumps({
+                    await websocket.send_text(encode_frame({
                         "status": "error",
                         "error": "Empty initialization message received"
                     }))
@@ -141,14 +232,14 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     init_message = json.loads(init_data)
                 except json.JSONDecodeError as e:
                     logger.error(f"JSON decode error: {e}, received: {repr(init_data)}")
-                    await websocket.send_text(json.dumps({
+                    await websocket.send_text(encode_frame({
                         "status": "error",
                         "error": f"Invalid JSON in initialization message: {str(e)}"
                     }))
                     return
                 
             except asyncio.TimeoutError:
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(encode_frame({
                     "status": "error",
                     "error": "Initialization timeout. Please send initialization message within 30 seconds."
                 }))
@@ -156,15 +247,34 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             
             session_id = init_message.get("session_id")
             
-            logger.info(f"Initializing unified knowledge base chat, session_id: {session_id}")
+            stream_format = init_message.get("stream_format", STREAM_FORMAT_JSON)
+            if stream_format not in STREAM_FORMATS:
+                await websocket.send_text(encode_frame({
+                    "status": "error",
+                    "error": f"Unsupported stream_format '{stream_format}'. Use one of: {', '.join(STREAM_FORMATS)}"
+                }))
+                return
+            
+            try:
+                chunk_filter = _parse_chunk_filter(init_message)
+            except ValueError as e:
+                await websocket.send_text(encode_frame({
+                    "status": "error",
+                    "error": f"Invalid search scope in initialization message: {str(e)}"
+                }))
+                return
+            
+            logger.info(f"Initializing unified knowledge base chat, session_id: {session_id}, scope: {chunk_filter}")
             
             if "unified_kb" not in active_connections:
                 active_connections["unified_kb"] = {}
             active_connections["unified_kb"][client_id] = websocket
             
+            # Normally built by startup_event already; the first build loads the embedding model, so keep it off the loop
+            document_store = await asyncio.get_running_loop().run_in_executor(None, get_document_store)
             kb_status = document_store.get_knowledge_base_status()
             if kb_status['total_chunks'] == 0:
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(encode_frame({
                     "status": "error",
                     "error": "Knowledge base is empty. Please contact admin to upload documents."
                 }))
@@ -176,29 +286,72 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     session = chat_service.create_session(user.id, "unified_kb")
                     session_id = session.session_id
                     logger.info(f"Created new session as provided session_id not found: {session_id}")
+                else:
+                    memory.restore(chat_service.get_recent_turns(session.id, memory.recent_turns))
+                    logger.info(f"Restored {len(memory.turns)} turns for session {session_id}")
             else:
                 session = chat_service.create_session(user.id, "unified_kb")
                 session_id = session.session_id
                 logger.info(f"Created new session: {session_id}")
             
-            await websocket.send_text(json.dumps({
+            await websocket.send_text(encode_frame({
                 "status": "initialized",
                 "session_id": session_id,
+                "stream_format": stream_format,
                 "knowledge_base_status": kb_status,
                 "message": "Sage Assistant connected successfully. I'm ready to help you with questions about our knowledge base."
             }))
             is_initialized = True
             logger.info("Sage WebSocket initialized successfully for unified knowledge base")
             
+            inbox: asyncio.Queue = asyncio.Queue()
+            
+            async def send_queue_position(position: int):
+                if websocket.client_state.name == 'CONNECTED':
+                    await websocket.send_text(encode_frame({"status": "queued", "position": position}))
+            
+            async def scheduled_generation(messages, stream_writer: TokenStreamWriter):
+                # Waiting for a slot is part of the cancellable work, so stop also leaves the queue
+                async with llm_scheduler.slot(user.id, send_queue_position):
+                    return await _with_first_token_deadline(
+                        llm_model.stream_chat(messages, stream_writer.write),
+                        stream_writer,
+                        settings.LOAD_SHED_FIRST_TOKEN_TIMEOUT if settings.LOAD_SHED_ENABLED else 0
+                    )
+            
+            async def read_client_messages():
+                # Reads concurrently with generation so control messages take effect mid-stream
+                try:
+                    while True:
+                        data = await websocket.receive_text()
+                        if question_cancel is not None and not question_cancel.is_set():
+                            # Both stop and a new question abandon the answer in progress
+                            question_cancel.set()
+                        if not _is_cancel_message(data):
+                            await inbox.put(data)
+                except WebSocketDisconnect:
+                    pass
+                except Exception as e:
+                    logger.error(f"Error reading from WebSocket: {str(e)}")
+                finally:
+                    # A client that went away will never read the rest of the answer either
+                    if question_cancel is not None:
+                        question_cancel.set()
+                    inbox.put_nowait(None)
+            
+            reader_task = asyncio.create_task(read_client_messages())
+            
             while True:
                 try:
                     logger.info("Waiting for question...")
-                    data = await websocket.receive_text()
+                    data = await inbox.get()
+                    if data is None:
+                        raise WebSocketDisconnect()
                     logger.info(f"Received data: {data}")
                     
                     if not data or data.strip() == "":
                         if websocket.client_state.name == 'CONNECTED':
-                            await websocket.send_text(json.dumps({
+                            await websocket.send_text(encode_frame({
                                 "status": "error", 
                                 "error": "Empty message received"
                             }))
@@ -212,105 +365,121 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     
                     if not question or not isinstance(question, str) or question.strip() == "":
                         if websocket.client_state.name == 'CONNECTED':
-                            await websocket.send_text(json.dumps({
+                            await websocket.send_text(encode_frame({
                                 "status": "error",
                                 "error": "Invalid or empty question."
                             }))
                         continue
                     
                     logger.info(f"Processing question: {question}")
+                    # Set by a stop or newer question at any point, including during retrieval
+                    question_cancel = asyncio.Event()
                     
                     with Timer() as timer:
-                        context_chunks = await document_store.search(
-                            question,
-                            k=settings.SIMILAR_DOCS_COUNT
+                        stream_writer = TokenStreamWriter(
+                            websocket,
+                            stream_format,
+                            flush_interval=settings.STREAM_FLUSH_INTERVAL_MS / 1000,
+                            max_bytes=settings.STREAM_FLUSH_BYTES
                         )
+                        token_callback = stream_writer.write
+                        cancelled = False
+                        degraded = False
                         
-                        formatted_chat_history = ""
-                        for entry in chat_history:
-                            formatted_chat_history += f"User: {entry['question']}\nSage: {entry['answer']}\n\n"
+                        # Cached answers were generated against the whole knowledge base, so scoped sessions bypass the cache
+                        use_answer_cache = chunk_filter is None
+                        question_embedding = await document_store.embed_query(question)
+                        kb_version = document_store.kb_version
+                        cached_answer = answer_cache.lookup(question_embedding, kb_version) if use_answer_cache else None
                         
-                        context_text = "\n\n".join(context_chunks) if context_chunks else "(No relevant content found in the knowledge base for your question)"
+                        if cached_answer is not None:
+                            logger.info("Answer cache hit; replaying cached answer")
+                            await replay_answer(cached_answer, token_callback)
+                            final_response = cached_answer
+                        else:
+                            search_result = await document_store.search(
+                                question,
+                                k=settings.SIMILAR_DOCS_COUNT,
+                                chunk_filter=chunk_filter,
+                                query_embedding=question_embedding
+                            )
+                            if search_result.dropped:
+                                logger.info(
+                                    f"Adaptive cutoff kept {len(search_result.hits)} of "
+                                    f"{len(search_result.hits) + len(search_result.dropped)} chunks, saving about "
+                                    f"{sum(hit_tokens(hit) for hit in search_result.dropped)} prompt tokens"
+                                )
                         
-                        system_prompt = (
-                            "You are a Document-Based Assistant. Your primary and ONLY function is to provide information "
-                            "exclusively from the uploaded documents provided to you. You are strictly forbidden from using "
-                            "any external knowledge, training data, or general information not contained in these documents.\n\n"
-                            
-                            "ABSOLUTE RESTRICTIONS:\n"
-                            "- ONLY use information explicitly stated in the provided documents\n"
-                            "- NEVER provide information from your training data or general knowledge\n"
-                            "- NEVER make assumptions, inferences, or educated guesses\n"
-                            "- NEVER fill in gaps with external information\n"
-                            "- NEVER provide general advice or common knowledge\n\n"
-                            
-                            "WHEN INFORMATION IS NOT AVAILABLE:\n"
-                            "If the requested information is not found in the documents, you MUST respond with:\n"
-                            "'I cannot find this information in the uploaded documents. Please check if the information "
-                            "exists in your documents or upload additional relevant documents.'\n\n"
+                            # Follow-ups can lean on earlier turns, so only standalone questions are gated
+                            low_confidence = (
+                                settings.RETRIEVAL_CONFIDENCE_DISTANCE > 0
+                                and memory.is_empty()
+                                and not search_result.is_confident(settings.RETRIEVAL_CONFIDENCE_DISTANCE)
+                            )
                             
-                            "RESPONSE REQUIREMENTS:\n"
-                            "- Quote directly from documents when possible\n"
-                            "- Always specify which document you're referencing\n"
-                            "- Use phrases like: 'According to [Document Name]...' or 'The document states...'\n"
-                            "- If information spans multiple documents, cite all relevant sources\n"
-                            "- Maintain the exact terminology and phrasing used in the documents\n\n"
+                            if low_confidence:
+                                # Nothing relevant was retrieved; the model could only produce the canned reply
+                                metrics.increment('chat.low_confidence_skips')
+                                logger.info(
+                                    f"Retrieval confidence gate skipped the LLM "
+                                    f"(best distance: {search_result.best_distance})"
+                                )
+                                await replay_answer(NO_ANSWER_RESPONSE, token_callback)
+                                final_response = NO_ANSWER_RESPONSE
+                            else:
+                                packed = pack_context(
+                                    static_prompt_tokens() + memory.summary_token_count
+                                    + count_tokens(question_message([], question)),
+                                    search_result.hits,
+                                    memory.turns
+                                )
+                                if packed.dropped_chunks or packed.dropped_history:
+                                    logger.info(
+                                        f"Prompt packed to {packed.tokens} of {prompt_budget()} tokens, dropping "
+                                        f"{packed.dropped_chunks} chunks and {packed.dropped_history} history turns"
+                                    )
+                                
+                                messages = build_messages(packed.chunks, packed.history, question, memory.summary)
+                                
+                                try:
+                                    if question_cancel.is_set():
+                                        # Stopped before the LLM was reached, so no slot is taken
+                                        final_response, cancelled = None, True
+                                    else:
+                                        final_response, cancelled = await _run_cancellable(
+                                            scheduled_generation(messages, stream_writer),
+                                            question_cancel
+                                        )
+                                except Exception as e:
+                                    # Only a busy or unreachable LLM is shed; a request Ollama rejected is a real error.
+                                    # Once tokens are on screen an excerpt list cannot replace them either.
+                                    sheddable = isinstance(e, Overloaded) or is_backend_failure(e)
+                                    if not sheddable or not settings.LOAD_SHED_ENABLED or stream_writer.text:
+                                        raise
+                                    degraded = True
+                                    metrics.increment('chat.degraded_answers')
+                                    logger.warning(f"LLM unavailable, answering with retrieved excerpts: {str(e)}")
+                                
+                                if degraded:
+                                    final_response = excerpts_answer(
+                                        search_result.hits,
+                                        settings.LOAD_SHED_EXCERPTS,
+                                        settings.LOAD_SHED_EXCERPT_CHARS
+                                    )
+                                    await replay_answer(final_response, token_callback)
+                                elif cancelled:
+                                    # Keep what the user already saw so history and the saved message match it
+                                    final_response = stream_writer.text
+                                    metrics.increment('chat.cancellations')
+                                    logger.info(f"Generation cancelled by client after {len(final_response)} characters")
                             
-                            "QUALITY STANDARDS:\n"
-                            "- Accuracy: Information must match the documents exactly\n"
-                            "- Traceability: Every statement must be traceable to a specific document\n"
-                            "- Completeness: Include all relevant information from the documents\n"
-                            "- Clarity: Present information in an organized, understandable manner\n\n"
-                            
-                            "HANDLING DIFFERENT DOCUMENT TYPES:\n"
-                            "- Technical documents: Use precise technical language as written\n"
-                            "- Policies/Procedures: Follow the exact steps and guidelines provided\n"
-                            "- Reports/Data: Present findings exactly as documented\n"
-                            "- Manuals/Guides: Reference specific sections and instructions\n\n"
-                            
-                            "CONVERSATION CONTINUITY:\n"
-                            "- Use chat history to maintain context within the conversation\n"
-                            "- Refer back to previously discussed document sections when relevant\n"
-                            "- Build upon previous answers only using document information\n\n"
-                            
-                            "DOCUMENT CONTEXT:\n"
-                            f"{context_text}\n\n"
-                            
-                            "CHAT HISTORY:\n"
-                            f"{formatted_chat_history}\n\n"
-                            
-                            "CRITICAL REMINDER:\n"
-                            "You are bound by the documents above. If information doesn't exist in these documents, "
-                            "you cannot and must not provide it. Your value comes from being a reliable, accurate "
-                            "source that users can trust to only give them information from their specific documents."
-                        )
+                            # Only standalone answers are reusable; follow-ups depend on this session's history
+                            if use_answer_cache and not low_confidence and not cancelled and not degraded and memory.is_empty():
+                                answer_cache.store(question_embedding, final_response, kb_version)
                         
-                        messages = [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": f"User's Question: {question}"}
-                        ]
-                        
-                        async def token_callback(token):
-                            try:
-                                if websocket.client_state.name == 'CONNECTED':
-                                    await websocket.send_text(json.dumps({
-                                        "status": "streaming",
-                                        "token": token
-                                    }))
-                            except Exception as e:
-                                logger.error(f"Error sending token: {e}")
-                                return False
-                            return True
-                        
-                        final_response = await llm_model.stream_chat(messages, token_callback)
-                        
-                        chat_history.append({
-                            "question": question,
-                            "answer": final_response
-                        })
-                        
-                        if len(chat_history) > 10:
-                            chat_history = chat_history[-10:]
+                        # Raw excerpts are not an answer the model should build on in later turns
+                        if not degraded:
+                            memory.add_turn(question, final_response)
                         
                         chat_service.save_message(
                             session.id, 
@@ -320,10 +489,13 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                             False
                         )
                     
+                    await stream_writer.close()
                     if websocket.client_state.name == 'CONNECTED':
-                        await websocket.send_text(json.dumps({
+                        await websocket.send_text(encode_frame({
                             "status": "complete",
                             "answer": final_response,
+                            "cancelled": cancelled,
+                            "degraded": degraded,
                             "time": timer.interval,
                             "session_id": session_id
                         }))
@@ -333,11 +505,19 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                 except WebSocketDisconnect:
                     logger.info(f"WebSocket disconnected (initialized: {is_initialized})")
                     break
+                except RateLimited as e:
+                    logger.info(f"User {user.id} rate limited for {e.retry_after:.1f}s")
+                    if websocket.client_state.name == 'CONNECTED':
+                        await websocket.send_text(encode_frame({
+                            "status": "error",
+                            "error": f"You are asking questions too quickly. Please try again in {max(1, round(e.retry_after))} seconds.",
+                            "retry_after": e.retry_after
+                        }))
                 except Exception as e:
                     logger.error(f"Error in WebSocket chat: {str(e)}")
                     try:
                         if websocket.client_state.name == 'CONNECTED':
-                            await websocket.send_text(json.dumps({
+                            await websocket.send_text(encode_frame({
                                 "status": "error",
                                 "error": str(e)
                             }))
@@ -350,13 +530,16 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             logger.error(f"WebSocket startup error: {str(e)}")
             try:
                 if websocket.client_state.name == 'CONNECTED':
-                    await websocket.send_text(json.dumps({
+                    await websocket.send_text(encode_frame({
                         "status": "error",
                         "error": str(e)
                     }))
             except:
                 logger.error("Failed to send startup error to client - connection already closed")
         finally:
+            memory.close()
+            if reader_task is not None:
+                reader_task.cancel()
             if "unified_kb" in active_connections and client_id in active_connections["unified_kb"]:
                 del active_connections["unified_kb"][client_id]
                 if not active_connections["unified_kb"]:
@@ -377,7 +560,7 @@ async def websocket_heartbeat():
                 try:
                     if client_id in active_connections.get("unified_kb", {}):
                         websocket = active_connections["unified_kb"][client_id]
-                        await websocket.send_text(json.dumps({
+                        await websocket.send_text(encode_frame({
                             "status": "heartbeat"
                         }))
                 except Exception as e:
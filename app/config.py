@@ -20,9 +20,51 @@ class Settings(BaseSettings):
     
     # Ollama settings
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_BASE_URLS: str = ""  # comma-separated backend pool; OLLAMA_BASE_URL is used when empty
+    OLLAMA_PROBE_INTERVAL: float = 10.0  # seconds between background health probes
+    OLLAMA_PROBE_TIMEOUT: float = 3.0
+    OLLAMA_FAILURE_THRESHOLD: int = 2  # consecutive failures before a backend is ejected
+    OLLAMA_EJECT_SECONDS: float = 30.0
     
     # Model settings for gemma3:12b
     MODEL_NAME: str = "qwen2.5:7b"
+    TOKENIZER_MODEL: str = "Qwen/Qwen2.5-7B-Instruct"  # Hugging Face tokenizer matching MODEL_NAME
+    LLM_CONTEXT_WINDOW: int = 8192  # num_ctx sent to Ollama; prompts are packed to fit
+    LLM_MAX_OUTPUT_TOKENS: int = 2048
+    LLM_KEEP_ALIVE: str = "30m"  # Ollama keep_alive duration; "-1m" (or -1) keeps the model loaded indefinitely
+    
+    # Model warm-start: preload at startup, keep resident during warm hours (server local time)
+    LLM_PRELOAD_ON_STARTUP: bool = True
+    LLM_WARM_INTERVAL: float = 300.0  # seconds between keep-alive checks; keep below LLM_KEEP_ALIVE
+    LLM_WARM_HOURS: str = "08:00-19:00"
+    LLM_WARM_WEEKDAYS: str = "0,1,2,3,4"  # Monday = 0
+    LLM_COLD_START_THRESHOLD: float = 1.0  # model load seconds that count as a cold start
+    
+    # LLM admission control, per worker process (match OLLAMA_NUM_PARALLEL / WORKERS)
+    LLM_MAX_CONCURRENCY: int = 2
+    LLM_USER_BURST: int = 5  # generations a user may start back to back; 0 disables the rate limit
+    LLM_USER_RATE_PER_MINUTE: float = 10.0
+    
+    # Load shedding: under overload answer with the top retrieved excerpts instead of the LLM
+    LOAD_SHED_ENABLED: bool = True
+    LOAD_SHED_QUEUE_DEPTH: int = 8  # requests already waiting for a slot; 0 disables
+    LOAD_SHED_MAX_QUEUE_WAIT: float = 20.0  # seconds in the queue before giving up; 0 disables
+    LOAD_SHED_FIRST_TOKEN_TIMEOUT: float = 30.0  # seconds from getting a slot to the first token; 0 disables
+    LOAD_SHED_EXCERPTS: int = 3
+    LOAD_SHED_EXCERPT_CHARS: int = 600
+    
+    # Conversation memory: recent turns verbatim, older ones folded into a running summary
+    CHAT_MEMORY_RECENT_TURNS: int = 4
+    CHAT_MEMORY_TOKEN_BUDGET: int = 1500  # summary plus verbatim turns
+    CHAT_MEMORY_SUMMARY_TOKENS: int = 300
+    
+    # Per-worker cache of recent session turns, restored when a websocket reconnects
+    SESSION_HISTORY_CACHE_SIZE: int = 256
+    SESSION_HISTORY_CACHE_TTL: int = 600  # seconds
+    
+    # Streamed tokens are coalesced into one websocket frame per window or byte threshold
+    STREAM_FLUSH_INTERVAL_MS: float = 40.0
+    STREAM_FLUSH_BYTES: int = 256
     TEMPERATURE: float = 0.0
     TOP_P: float = 0.95
     REPETITION_PENALTY: float = 1.15
@@ -33,6 +75,20 @@ class Settings(BaseSettings):
     EMBEDDINGS_MODEL: str = "BAAI/bge-base-en-v1.5"
     SIMILAR_DOCS_COUNT: int = 6
     OUTPUT_FOLDER: str = "./rag-vectordb"
+    INDEX_RELOAD_INTERVAL: float = 2.0  # seconds between checks for a newer index generation
+    INDEX_SNAPSHOT_RETENTION: int = 3
+    
+    # FAISS index settings (flat, ivf_flat, hnsw, ivf_pq)
+    INDEX_TYPE: str = "flat"
+    IVF_NLIST: int = 0  # 0 = derive from corpus size
+    IVF_NPROBE: int = 16
+    IVF_MIN_TRAINING_SIZE: int = 10000  # stay on flat below this; brute force is fast enough there
+    IVF_RETRAIN_GROWTH: float = 4.0  # retrain once the corpus is this many times its training size; 0 disables
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    PQ_M: int = 16
+    PQ_NBITS: int = 8
     
     # File Upload
     MAX_FILE_SIZE: int = 10485760
@@ -53,6 +109,37 @@ class Settings(BaseSettings):
     DB_POOL_SIZE: int = 10
     DB_MAX_OVERFLOW: int = 20
     EMBEDDING_CACHE_SIZE: int = 1000
+    RETRIEVAL_WORKERS: int = 2
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_BATCH_WAIT_MS: float = 5.0
+    
+    # Semantic answer cache
+    ANSWER_CACHE_SIZE: int = 500
+    ANSWER_CACHE_TTL: int = 3600  # seconds
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # cosine similarity
+    
+    # Hybrid retrieval (BM25 keyword + vector, fused by reciprocal rank)
+    HYBRID_SEARCH: bool = True
+    HYBRID_CANDIDATES: int = 20  # candidates taken from each retriever before fusion
+    RRF_K: int = 60
+    KEYWORD_MAX_TERMS: int = 8  # distinct question terms looked up, stopwords excluded
+    KEYWORD_MAX_POSTINGS: int = 2000  # matching chunks BM25 may score per query; rarest terms go first
+    
+    # Optional cross-encoder rerank of retrieval candidates
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20
+    RERANK_TIMEOUT_MS: float = 300.0
+    RERANK_CACHE_SIZE: int = 5000
+    
+    # Adaptive k: drop hits much farther from the query than the best one
+    ADAPTIVE_K: bool = True
+    ADAPTIVE_K_MIN: int = 2
+    DISTANCE_CUTOFF_MARGIN: float = 0.25  # squared L2 added to the best hit's distance
+    DISTANCE_CUTOFF_ABSOLUTE: float = 0.0  # squared L2; 0 disables
+    
+    # Skip the LLM and answer "not found" when even the best hit is farther than this (squared L2; 0 disables)
+    RETRIEVAL_CONFIDENCE_DISTANCE: float = 1.1
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -84,6 +171,7 @@ class Settings(BaseSettings):
         self.DB_MAX_OVERFLOW = min(30, self.WORKERS * 3)
         
         self.EMBEDDING_CACHE_SIZE = min(1000, int(memory_gb * 100))
+        self.RETRIEVAL_WORKERS = max(1, min(4, cpu_count // 2))
         
         print(f"Hardware Configuration Detected:")
         print(f"CPU Cores: {cpu_count}")
@@ -94,7 +182,8 @@ class Settings(BaseSettings):
         print(f"Max Concurrent Connections: {self.MAX_CONCURRENT_CONNECTIONS}")
         print(f"Database Pool Size: {self.DB_POOL_SIZE}")
         print(f"Embedding Cache Size: {self.EMBEDDING_CACHE_SIZE}")
-        print(f"Using Ollama Model: {self.MODEL_NAME} at {self.OLLAMA_BASE_URL}")
+        print(f"Retrieval Workers: {self.RETRIEVAL_WORKERS}")
+        print(f"Using Ollama Model: {self.MODEL_NAME} at {self.OLLAMA_BASE_URLS or self.OLLAMA_BASE_URL}")
     
     @property
     def DATABASE_URL(self) -> str:
@@ -11,7 +11,10 @@ from app.database import Base, engine, check_db_connection
 from app.api import auth, admin, chat, users
 from app.api.chat import websocket_heartbeat
 from app.services.document_processor import start_document_processor, stop_document_processor
-from app.services.document_store import DocumentStore
+from app.services.document_store import get_document_store, read_document_status, close_document_stores
+from app.services.llm_warmup import get_model_warmer
+from app.services.ollama_pool import get_ollama_pool
+from app.services.prompt_templates import static_prompt_tokens
 from app.config import settings
 import logging
 
@@ -22,6 +25,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 Base.metadata.create_all(bind=engine)
+# create_all skips tables that already exist, so add any indexes introduced since they were created
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 app = FastAPI(
     title="Enterprise Knowledge Base API with FAISS - Multi-User",
@@ -65,6 +72,32 @@ async def startup_event():
         logger.error(f"Failed to start document processor: {str(e)}")
         sys.exit(1)
     
+    try:
+        # Loads the embedding model and FAISS index; in an executor so the loop stays free meanwhile
+        await asyncio.get_running_loop().run_in_executor(None, get_document_store)
+        logger.info("Document store loaded")
+    except Exception as e:
+        logger.error(f"Failed to load document store: {str(e)}")
+    
+    try:
+        # The first count downloads the tokenizer from the Hub; doing it here keeps that off the first question
+        system_tokens = await asyncio.get_running_loop().run_in_executor(None, static_prompt_tokens)
+        logger.info(f"Tokenizer ready; system prompt is {system_tokens} tokens")
+    except Exception as e:
+        logger.error(f"Failed to load tokenizer: {str(e)}")
+    
+    try:
+        get_ollama_pool().start()
+        logger.info(f"Ollama backends: {', '.join(backend.url for backend in get_ollama_pool().backends)}")
+    except Exception as e:
+        logger.error(f"Failed to start Ollama health probes: {str(e)}")
+    
+    try:
+        get_model_warmer().start()
+        logger.info(f"Model warm-start manager started for {settings.MODEL_NAME}")
+    except Exception as e:
+        logger.error(f"Failed to start model warm-start manager: {str(e)}")
+    
     try:
         asyncio.create_task(websocket_heartbeat())
         logger.info("WebSocket heartbeat service started")
@@ -99,6 +132,15 @@ async def cleanup_services():
         logger.info("Document processor stopped")
     except Exception as e:
         logger.error(f"Error stopping document processor: {str(e)}")
+    
+    try:
+        close_document_stores()
+        logger.info("Document stores closed")
+    except Exception as e:
+        logger.error(f"Error closing document stores: {str(e)}")
+    
+    get_model_warmer().stop()
+    get_ollama_pool().stop()
 
 @app.get("/")
 def root():
@@ -187,9 +229,7 @@ async def serve_chat():
 async def get_document_status_public(document_id: str):
     from app.services.document_processor import get_document_processing_status
     
-    document_store = DocumentStore(settings.OUTPUT_FOLDER)
-    
-    faiss_status = document_store.get_document_status(document_id)
+    faiss_status = read_document_status(document_id)
     
     processing_status = get_document_processing_status(document_id)
     
@@ -200,7 +240,7 @@ async def get_document_status_public(document_id: str):
         "document_id": document_id,
         "status": faiss_status.get('status', 'unknown') if faiss_status else 'unknown',
         "created_at": faiss_status.get('created_at') if faiss_status else None,
-        "chunks_count": len(faiss_status.get('chunks', [])) if faiss_status else 0
+        "chunks_count": faiss_status.get('chunk_count', 0) if faiss_status else 0
     }
     
     if processing_status:
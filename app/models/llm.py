@@ -1,75 +1,138 @@
+import time
 import asyncio
-from ollama import AsyncClient
+import logging
+from app.services.llm_warmup import get_model_warmer
+from app.services.ollama_pool import NoBackendAvailable, get_ollama_pool, is_backend_failure, keep_alive_value
+from app.utils.metrics import metrics
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 class LLMModel:
     def __init__(self):
-        self.client = None
+        self.pool = get_ollama_pool()
         self.model_name = settings.MODEL_NAME
         self.temperature = settings.TEMPERATURE
         self.top_p = settings.TOP_P
-        self.max_tokens = 2048
+        self.max_tokens = settings.LLM_MAX_OUTPUT_TOKENS
+        self.context_window = settings.LLM_CONTEXT_WINDOW
+        # How long Ollama keeps the model (and its prompt-prefix KV cache) loaded after a request
+        self.keep_alive = keep_alive_value(settings.LLM_KEEP_ALIVE)
 
     def get_client(self):
-        if self.client is None:
-            self.client = AsyncClient(
-                host=settings.OLLAMA_BASE_URL
-            )
-        return self.client
+        return self.pool.pick().client
+
+    def _options(self, max_tokens=None):
+        return {
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'num_predict': max_tokens or self.max_tokens,
+            'num_ctx': self.context_window
+        }
 
     async def stream_chat(self, messages, callback=None):
-        """Stream chat responses with callback for each token"""
-        client = self.get_client()
+        """
+        Stream chat responses with callback for each token.
+        If a backend fails mid-answer, the request moves to another one with the partial answer
+        sent as an assistant prefix, so generation continues where it stopped.
+        """
+        started_at = time.perf_counter()
+        full_response = ""
+        first_token = True
+        tried = ()
         
-        try:
-            stream = await client.chat(
-                model=self.model_name,
-                messages=messages,
-                stream=True,
-                options={
-                    'temperature': self.temperature,
-                    'top_p': self.top_p,
-                    'num_predict': self.max_tokens
-                }
-            )
+        while True:
+            backend = self.pool.pick(exclude=tried)
+            request_messages = messages
+            if full_response:
+                request_messages = messages + [{"role": "assistant", "content": full_response}]
             
-            full_response = ""
-            async for chunk in stream:
-                if chunk and 'message' in chunk and 'content' in chunk['message']:
-                    token = chunk['message']['content']
-                    full_response += token
+            try:
+                with self.pool.lease(backend):
+                    stream = await backend.client.chat(
+                        model=self.model_name,
+                        messages=request_messages,
+                        stream=True,
+                        keep_alive=self.keep_alive,
+                        options=self._options()
+                    )
                     
-                    if callback:
-                        should_continue = await callback(token)
-                        if should_continue is False:
-                            # logger.info("Token streaming stopped by callback")
-                            break
-            
-            return full_response
+                    async for chunk in stream:
+                        if chunk and chunk.get('done'):
+                            self._record_prompt_eval(chunk, backend)
+                        if chunk and 'message' in chunk and 'content' in chunk['message']:
+                            token = chunk['message']['content']
+                            if first_token and token:
+                                # Drops sharply when Ollama reuses the cached prompt prefix
+                                metrics.observe('llm.time_to_first_token', time.perf_counter() - started_at)
+                                first_token = False
+                            full_response += token
+                            
+                            if callback:
+                                should_continue = await callback(token)
+                                if should_continue is False:
+                                    # logger.info("Token streaming stopped by callback")
+                                    break
+                
+                self.pool.mark_success(backend)
+                return full_response
             
-        except Exception as e:
-            raise Exception(f"Error in Ollama streaming: {str(e)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_backend_failure(e):
+                    # A bad request fails the same on every backend; do not count it against this one
+                    raise
+                self.pool.mark_failure(backend, e)
+                tried += (backend.url,)
+                if len(tried) >= len(self.pool.backends):
+                    raise NoBackendAvailable(f"Error in Ollama streaming: {str(e)}") from e
+                metrics.increment('ollama.failovers')
+                logger.warning(
+                    f"Ollama backend {backend.url} failed after {len(full_response)} characters, failing over: {str(e)}"
+                )
 
-    async def generate_response(self, messages):
-        """Generate non-streaming response"""
-        client = self.get_client()
-        
-        try:
-            response = await client.chat(
-                model=self.model_name,
-                messages=messages,
-                stream=False,
-                options={
-                    'temperature': self.temperature,
-                    'top_p': self.top_p,
-                    'num_predict': self.max_tokens
-                }
-            )
-            
-            return response['message']['content']
+    @staticmethod
+    def _record_prompt_eval(chunk, backend):
+        """Ollama's final chunk reports how many prompt tokens it actually had to evaluate, and any model load time"""
+        load_duration = chunk.get('load_duration')
+        if load_duration:
+            get_model_warmer().record_load(backend.url, load_duration / 1e9, "chat")
+        prompt_eval_count = chunk.get('prompt_eval_count')
+        prompt_eval_duration = chunk.get('prompt_eval_duration')
+        if prompt_eval_count is not None:
+            metrics.increment('llm.prompt_tokens_evaluated', prompt_eval_count)
+        if prompt_eval_duration is not None:
+            metrics.observe('llm.prompt_eval', prompt_eval_duration / 1e9)
+
+    async def generate_response(self, messages, max_tokens=None):
+        """Generate non-streaming response, retrying on another backend if one fails"""
+        tried = ()
+        while True:
+            backend = self.pool.pick(exclude=tried)
+            try:
+                with self.pool.lease(backend):
+                    response = await backend.client.chat(
+                        model=self.model_name,
+                        messages=messages,
+                        stream=False,
+                        keep_alive=self.keep_alive,
+                        options=self._options(max_tokens)
+                    )
+                self.pool.mark_success(backend)
+                self._record_prompt_eval(response, backend)
+                return response['message']['content']
             
-        except Exception as e:
-            raise Exception(f"Error in Ollama generation: {str(e)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                self.pool.mark_failure(backend, e)
+                tried += (backend.url,)
+                if len(tried) >= len(self.pool.backends):
+                    raise NoBackendAvailable(f"Error in Ollama generation: {str(e)}") from e
+                metrics.increment('ollama.failovers')
 
     def get_llm(self):
         """For backward compatibility with existing code"""
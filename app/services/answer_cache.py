@@ -0,0 +1,92 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import numpy as np
+from app.utils.metrics import metrics
+
+_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers keyed by question embedding.
+    A lookup hits when cosine similarity clears the threshold and the entry was produced
+    against the current knowledge base version; any version change empties the cache.
+    Entries expire after ttl seconds and the least recently used are evicted past max_size.
+    """
+
+    def __init__(self, max_size: int, ttl: float, threshold: float):
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self.threshold = threshold
+        self.kb_version: Optional[int] = None
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype='float32').ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sync_version(self, kb_version: int):
+        if self.kb_version != kb_version:
+            if self._entries:
+                metrics.increment('answer_cache.invalidations')
+            self._entries.clear()
+            self.kb_version = kb_version
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry['created_at'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, question_embedding, kb_version: int) -> Optional[str]:
+        if self.max_size == 0:
+            return None
+
+        query = self._unit(question_embedding)
+        with self._lock:
+            self._sync_version(kb_version)
+            self._expire(time.time())
+            if not self._entries:
+                metrics.increment('answer_cache.misses')
+                return None
+
+            keys = list(self._entries.keys())
+            matrix = np.stack([self._entries[key]['embedding'] for key in keys])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                metrics.increment('answer_cache.misses')
+                return None
+
+            self._entries.move_to_end(keys[best])
+            answer = self._entries[keys[best]]['answer']
+
+        metrics.increment('answer_cache.hits')
+        return answer
+
+    def store(self, question_embedding, answer: str, kb_version: int) -> None:
+        if self.max_size == 0 or not answer:
+            return
+
+        with self._lock:
+            self._sync_version(kb_version)
+            self._entries[self._next_key] = {
+                'embedding': self._unit(question_embedding),
+                'answer': answer,
+                'created_at': time.time()
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            metrics.set_gauge('answer_cache.size', len(self._entries))
+
+async def replay_answer(answer: str, callback: Callable[[str], Awaitable[bool]]) -> None:
+    """Send a cached answer through the streaming callback word by word, like a live generation"""
+    for token in _TOKEN_PATTERN.findall(answer):
+        if await callback(token) is False:
+            break
@@ -1,14 +1,64 @@
 import json
+import time
 import uuid
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.models.chat import ChatSession, ChatMessage
 from app.models.user import User
 from app.services.document_store import DocumentStore
 from app.config import settings
 
+class RecentTurnsCache:
+    """
+    Per-worker LRU of the latest turns of recently active sessions, keyed by session primary key,
+    so a client that drops and reconnects does not reload its history from the database each time.
+    Each entry records the id of the newest message it holds and is only served while that is
+    still the session's newest message, so turns saved by another worker are never missed.
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_pk: int, limit: int, latest_message_id: int) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(session_pk)
+            if (
+                entry is None
+                or entry['latest_message_id'] != latest_message_id
+                or entry['limit'] < limit
+                or time.time() - entry['stored_at'] > self.ttl
+            ):
+                return None
+            self._entries.move_to_end(session_pk)
+            return list(entry['turns'][-limit:])
+
+    def put(self, session_pk: int, turns: List[Dict], limit: int, latest_message_id: int) -> None:
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[session_pk] = {
+                'turns': list(turns[-limit:]),
+                'limit': limit,
+                'latest_message_id': latest_message_id,
+                'stored_at': time.time()
+            }
+            self._entries.move_to_end(session_pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_pk: int) -> None:
+        with self._lock:
+            self._entries.pop(session_pk, None)
+
+recent_turns_cache = RecentTurnsCache(settings.SESSION_HISTORY_CACHE_SIZE, settings.SESSION_HISTORY_CACHE_TTL)
+
 class ChatService:
-    def __init__(self, db: Session, document_store: DocumentStore):
+    def __init__(self, db: Session, document_store: Optional[DocumentStore] = None):
         self.db = db
         self.document_store = document_store
     
@@ -53,6 +103,33 @@ class ChatService:
             ChatSession.user_id == user_id
         ).first()
     
+    def get_recent_turns(self, session_id: int, limit: int) -> List[Dict]:
+        """
+        Latest turns of a session, oldest first. The newest message id is checked on every call
+        (an index-only lookup on (session_id, id)) to validate the cache; the turns themselves are
+        read only on a miss.
+        """
+        if limit <= 0:
+            return []
+        
+        latest_message_id = self.db.query(func.max(ChatMessage.id)).filter(
+            ChatMessage.session_id == session_id
+        ).scalar()
+        if latest_message_id is None:
+            return []
+        
+        turns = recent_turns_cache.get(session_id, limit, latest_message_id)
+        if turns is not None:
+            return turns
+        
+        rows = self.db.query(ChatMessage.id, ChatMessage.message, ChatMessage.response).filter(
+            ChatMessage.session_id == session_id
+        ).order_by(ChatMessage.id.desc()).limit(limit).all()
+        turns = [{"question": row.message, "answer": row.response} for row in reversed(rows)]
+        if rows:
+            recent_turns_cache.put(session_id, turns, limit, rows[0].id)
+        return turns
+    
     def save_message(self, session_id: int, message: str, response: str, 
                     processing_time: int, used_latest_data: bool = False) -> ChatMessage:
         """Save chat message to database"""
@@ -66,4 +143,5 @@ class ChatService:
         self.db.add(chat_message)
         self.db.commit()
         self.db.refresh(chat_message)
+        recent_turns_cache.discard(session_id)
         return chat_message
\ No newline at end of file
@@ -0,0 +1,370 @@
+import re
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_STORE_FILENAME = "chunks.sqlite3"
+
+# Hit texts are read through the OS page cache instead of being copied into the heap
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Keep IN (...) lists under SQLite's host parameter limit
+_BATCH_SIZE = 500
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS documents (
+        document_id TEXT PRIMARY KEY,
+        filename TEXT,
+        status TEXT NOT NULL,
+        error TEXT,
+        chunk_count INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS chunks (
+        chunk_id INTEGER PRIMARY KEY,
+        document_id TEXT NOT NULL,
+        filename TEXT,
+        page INTEGER,
+        chunk_index INTEGER,
+        text TEXT NOT NULL,
+        token_count INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id)",
+    "CREATE TABLE IF NOT EXISTS tombstones (chunk_id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS kb_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    # BM25 keyword index over chunk text. It is an external-content table, so the text is not
+    # stored twice, and the triggers keep it in step with every insert and delete on chunks.
+    # '-' and '_' are token characters so part numbers and policy codes stay whole terms.
+    """CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        text, content='chunks', content_rowid='chunk_id',
+        tokenize="unicode61 remove_diacritics 2 tokenchars '-_'"
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts (rowid, text) VALUES (new.chunk_id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.chunk_id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF text ON chunks BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.chunk_id, old.text);
+        INSERT INTO chunks_fts (rowid, text) VALUES (new.chunk_id, new.text);
+    END""",
+)
+
+# Terms as the FTS tokenizer sees them; everything else in a question is dropped
+_TERM_PATTERN = re.compile(r"[\w\-]+")
+
+# Function words match nearly every chunk and carry no BM25 weight, but FTS5 would still score
+# every row they match before applying LIMIT
+_STOPWORDS = frozenset("""
+    a about above after again against all am an and any are as at be because been before being
+    below between both but by can could did do does doing down during each few for from further
+    had has have having he her here hers herself him himself his how i if in into is it its itself
+    just me more most my myself no nor not now of off on once only or other our ours ourselves out
+    over own same she should so some such than that the their theirs them themselves then there
+    these they this those through to too under until up very was we were what when where which
+    while who whom why will with would you your yours yourself yourselves
+""".split())
+
+@dataclass(frozen=True)
+class ChunkFilter:
+    """Restricts a search to chunks of matching documents; unset fields do not filter"""
+    document_ids: Optional[Tuple[str, ...]] = None
+    file_types: Optional[Tuple[str, ...]] = None  # extensions without the dot, e.g. ('pdf', 'docx')
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+    def is_empty(self) -> bool:
+        return (self.document_ids is None and self.file_types is None
+                and self.uploaded_after is None and self.uploaded_before is None)
+
+    def where_clause(self) -> Tuple[str, List]:
+        """SQL conditions on the chunks table (aliased c) that implement the filter"""
+        document_conditions, params = [], []
+        if self.document_ids is not None:
+            document_conditions.append(f"d.document_id IN ({', '.join('?' for _ in self.document_ids)})")
+            params.extend(self.document_ids)
+        if self.file_types is not None:
+            document_conditions.append(
+                "(" + " OR ".join("LOWER(d.filename) LIKE ?" for _ in self.file_types) + ")"
+                if self.file_types else "0"
+            )
+            params.extend(f"%.{file_type.lower().lstrip('.')}" for file_type in self.file_types)
+        if self.uploaded_after is not None:
+            document_conditions.append("d.created_at >= ?")
+            params.append(self.uploaded_after.isoformat())
+        if self.uploaded_before is not None:
+            document_conditions.append("d.created_at < ?")
+            params.append(self.uploaded_before.isoformat())
+        if not document_conditions:
+            return "1", []
+        return (
+            "c.document_id IN (SELECT d.document_id FROM documents d WHERE " + " AND ".join(document_conditions) + ")",
+            params
+        )
+
+def _batches(ids: List[int]):
+    for start in range(0, len(ids), _BATCH_SIZE):
+        yield ids[start:start + _BATCH_SIZE]
+
+def _query_terms(query: str, max_terms: int) -> List[str]:
+    """
+    Distinct non-stopword terms of free text, at most max_terms of them. Codes (terms with digits
+    or dashes) and longer words go first, as they are the likeliest to be rare.
+    """
+    terms = dict.fromkeys(
+        term.lower() for term in _TERM_PATTERN.findall(query)
+        if term.strip('-_') and term.lower() not in _STOPWORDS
+    )
+    ranked = sorted(terms, key=lambda term: (not re.search(r"[\d\-_]", term), -len(term)))
+    return ranked[:max(0, max_terms)]
+
+def _match_expression(terms: Iterable[str]) -> Optional[str]:
+    """FTS5 OR-query of quoted terms, so user input can't inject FTS syntax"""
+    terms = list(terms)
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+class ChunkStore:
+    """
+    SQLite-backed document and chunk metadata keyed by chunk id (the FAISS id).
+    Every change is a small transaction, so save cost no longer grows with the corpus,
+    and search only reads the text of the chunks it actually returns.
+    Writes must happen under the DocumentStore write lock.
+    """
+
+    def __init__(self, base_path: Path, readonly: bool = False):
+        self.path = Path(base_path) / CHUNK_STORE_FILENAME
+        self.readonly = readonly
+        self._local = threading.local()
+        if not readonly:
+            conn = self._conn()
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(chunks)")}
+            if 'token_count' not in columns:
+                # Chunks stored before token counts were recorded are counted lazily at query time
+                conn.execute("ALTER TABLE chunks ADD COLUMN token_count INTEGER")
+            if self.get_state('fts_built') is None:
+                # Stores created before the keyword index existed: index their chunks once
+                conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+                self.set_state('fts_built', 1)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; each thread lazily opens its own
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.readonly:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30, isolation_level=None)
+            else:
+                conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                # INSERT OR REPLACE must fire the delete trigger so the keyword index drops the old text
+                conn.execute("PRAGMA recursive_triggers=ON")
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    # Knowledge base state
+
+    def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM kb_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_state(self, key: str, value) -> None:
+        self._conn().execute(
+            "INSERT INTO kb_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    def bump_kb_version(self) -> int:
+        """Advance the knowledge base version that caches of derived answers are keyed on"""
+        version = int(self.get_state('kb_version', '0')) + 1
+        self.set_state('kb_version', version)
+        return version
+
+    def allocate_chunk_ids(self, count: int) -> List[int]:
+        start_id = int(self.get_state('next_chunk_id', '0'))
+        self.set_state('next_chunk_id', start_id + count)
+        return list(range(start_id, start_id + count))
+
+    # Documents
+
+    def upsert_document(self, document_id: str, **fields) -> None:
+        columns = ['document_id'] + list(fields.keys())
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields) or "document_id = document_id"
+        self._conn().execute(
+            f"INSERT INTO documents ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT(document_id) DO UPDATE SET {updates}",
+            [document_id] + list(fields.values())
+        )
+
+    def get_document(self, document_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT document_id, filename, status, error, chunk_count, created_at "
+            "FROM documents WHERE document_id = ?",
+            (document_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        document = dict(row)
+        if document['error'] is None:
+            del document['error']
+        return document
+
+    def delete_document(self, document_id: str) -> List[int]:
+        """Remove a document and its chunks, returning the removed chunk ids"""
+        chunk_ids = self.document_chunk_ids(document_id)
+        conn = self._conn()
+        conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+        conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+        return chunk_ids
+
+    def document_chunk_ids(self, document_id: str) -> List[int]:
+        rows = self._conn().execute(
+            "SELECT chunk_id FROM chunks WHERE document_id = ?", (document_id,)
+        ).fetchall()
+        return [row['chunk_id'] for row in rows]
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        total_documents, completed_documents = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(status = 'completed'), 0) FROM documents"
+        ).fetchone()
+        total_chunks = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {
+            'total_documents': total_documents,
+            'completed_documents': completed_documents,
+            'total_chunks': total_chunks
+        }
+
+    # Chunks
+
+    def add_chunks(self, chunks: Iterable[Dict]) -> None:
+        self._conn().executemany(
+            "INSERT OR REPLACE INTO chunks (chunk_id, document_id, filename, page, chunk_index, text, token_count) "
+            "VALUES (:chunk_id, :document_id, :filename, :page, :chunk_index, :text, :token_count)",
+            ({'token_count': None, **chunk} for chunk in chunks)
+        )
+
+    def delete_chunks(self, chunk_ids: List[int]) -> None:
+        conn = self._conn()
+        for batch in _batches(chunk_ids):
+            conn.execute(
+                f"DELETE FROM chunks WHERE chunk_id IN ({', '.join('?' for _ in batch)})", batch
+            )
+
+    def get_chunks(self, chunk_ids: List[int]) -> Dict[int, Dict]:
+        """Fetch chunks (with text) by id; ids that no longer exist are simply absent"""
+        conn = self._conn()
+        chunks = {}
+        for batch in _batches([int(chunk_id) for chunk_id in chunk_ids]):
+            rows = conn.execute(
+                "SELECT chunk_id, document_id, filename, page, chunk_index, text, token_count FROM chunks "
+                f"WHERE chunk_id IN ({', '.join('?' for _ in batch)})",
+                batch
+            ).fetchall()
+            for row in rows:
+                chunks[row['chunk_id']] = dict(row)
+        return chunks
+
+    def keyword_search(self, query: str, k: int, chunk_filter: Optional[ChunkFilter] = None,
+                       max_terms: int = 8, max_postings: int = 2000) -> List[int]:
+        """
+        Chunk ids ranked by BM25 relevance to the query's terms, best first.
+        FTS5 scores every matching row before LIMIT, so cost follows the number of matches.
+        Terms are used rarest first while their combined matches stay within max_postings;
+        terms too common to fit add little to BM25 and are left to the vector search.
+        """
+        if k <= 0:
+            return []
+        try:
+            expression = _match_expression(self._selective_terms(_query_terms(query, max_terms), max_postings))
+            if expression is None:
+                return []
+            if chunk_filter is None or chunk_filter.is_empty():
+                rows = self._conn().execute(
+                    "SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (expression, k)
+                ).fetchall()
+            else:
+                where, params = chunk_filter.where_clause()
+                rows = self._conn().execute(
+                    "SELECT chunks_fts.rowid FROM chunks_fts JOIN chunks c ON c.chunk_id = chunks_fts.rowid "
+                    f"WHERE chunks_fts MATCH ? AND {where} ORDER BY rank LIMIT ?",
+                    [expression] + params + [k]
+                ).fetchall()
+        except sqlite3.OperationalError as e:
+            # Read-only stores opened before the keyword index was created have no chunks_fts table
+            logger.warning(f"Keyword search unavailable: {e}")
+            return []
+        return [row[0] for row in rows]
+
+    def _selective_terms(self, terms: List[str], max_postings: int) -> List[str]:
+        """Rarest terms whose matches fit in max_postings; counting stops past the budget, so this stays cheap"""
+        conn = self._conn()
+        counts = {}
+        for term in terms:
+            counts[term] = conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM chunks_fts WHERE chunks_fts MATCH ? LIMIT ?)",
+                (f'"{term}"', max_postings + 1)
+            ).fetchone()[0]
+        
+        selected, postings = [], 0
+        for term in sorted(terms, key=lambda term: counts[term]):
+            if counts[term] == 0:
+                continue
+            if postings + counts[term] > max_postings:
+                break
+            selected.append(term)
+            postings += counts[term]
+        return selected
+
+    def filter_chunk_ids(self, chunk_filter: ChunkFilter) -> List[int]:
+        where, params = chunk_filter.where_clause()
+        return [row[0] for row in self._conn().execute(f"SELECT c.chunk_id FROM chunks c WHERE {where}", params)]
+
+    def all_chunk_ids(self) -> List[int]:
+        return [row[0] for row in self._conn().execute("SELECT chunk_id FROM chunks ORDER BY chunk_id")]
+
+    def chunk_count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    # Tombstones for index types that cannot remove vectors
+
+    def tombstones(self) -> frozenset:
+        return frozenset(row[0] for row in self._conn().execute("SELECT chunk_id FROM tombstones"))
+
+    def add_tombstones(self, chunk_ids: List[int]) -> None:
+        self._conn().executemany(
+            "INSERT OR IGNORE INTO tombstones (chunk_id) VALUES (?)", [(int(chunk_id),) for chunk_id in chunk_ids]
+        )
+
+    def clear_tombstones(self) -> None:
+        self._conn().execute("DELETE FROM tombstones")
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from app.services.llm_scheduler import llm_scheduler
+from app.services.prompt_packer import history_entry_tokens
+from app.services.token_counter import count_tokens
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and a document assistant. "
+    "Merge the new exchanges into the existing summary. Keep the topics, documents, facts and open "
+    "questions that later questions may refer back to; drop pleasantries and repetition. "
+    "Reply with the updated summary only, in at most {max_words} words."
+)
+
+class ConversationMemory:
+    """
+    Chat memory for one websocket session: the most recent turns verbatim plus a running summary
+    of everything older. Turns that no longer fit in recent_turns or the token budget are folded
+    into the summary by a background task between questions, so the LLM call for it is never on
+    the critical path; it runs in a background scheduler slot, behind any queued question.
+    Until a turn is folded it is still offered verbatim.
+    """
+
+    def __init__(self, llm_model, recent_turns: int, token_budget: int, summary_tokens: int):
+        self.llm_model = llm_model
+        self.recent_turns = max(1, recent_turns)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self._summary_token_count = 0
+        self._turns: List[Dict] = []
+        self._pending: List[Dict] = []
+        self._fold_task: Optional[asyncio.Task] = None
+
+    def is_empty(self) -> bool:
+        return not (self.summary or self._turns or self._pending)
+
+    @property
+    def turns(self) -> List[Dict]:
+        """Verbatim turns, oldest first, including those still waiting to be summarized"""
+        return self._pending + self._turns
+
+    @property
+    def summary_token_count(self) -> int:
+        return self._summary_token_count
+
+    def restore(self, turns: List[Dict]) -> None:
+        """
+        Seed memory with turns saved before a reconnect, preferring the newest. Turns that do not fit
+        the limits are dropped rather than summarized, so reconnecting never costs an LLM call.
+        """
+        self._turns = []
+        for turn in reversed(turns[-self.recent_turns:]):
+            if self._turns and self._verbatim_tokens() + history_entry_tokens(turn) > self.token_budget:
+                break
+            self._turns.insert(0, {"question": turn['question'], "answer": turn['answer']})
+
+    def add_turn(self, question: str, answer: str) -> None:
+        self._turns.append({"question": question, "answer": answer})
+
+        # Keep at least the latest turn verbatim; everything beyond the limits is folded
+        while len(self._turns) > 1 and (
+            len(self._turns) > self.recent_turns or self._verbatim_tokens() > self.token_budget
+        ):
+            self._pending.append(self._turns.pop(0))
+
+        if self._pending and (self._fold_task is None or self._fold_task.done()):
+            self._fold_task = asyncio.create_task(self._fold_pending())
+
+    def _verbatim_tokens(self) -> int:
+        return self._summary_token_count + sum(history_entry_tokens(entry) for entry in self._turns)
+
+    async def _fold_pending(self):
+        while self._pending:
+            batch = list(self._pending)
+            try:
+                summary = await self._summarize(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.increment('chat_memory.summary_errors')
+                logger.error(f"Error summarizing conversation: {str(e)}")
+                # Never let unsummarized turns grow without bound; the oldest are dropped instead
+                del self._pending[:max(0, len(self._pending) - self.recent_turns)]
+                return
+
+            self.summary = summary
+            self._summary_token_count = count_tokens(summary)
+            del self._pending[:len(batch)]
+            metrics.increment('chat_memory.turns_folded', len(batch))
+
+    async def _summarize(self, turns: List[Dict]) -> str:
+        exchanges = "".join(f"User: {turn['question']}\nSage: {turn['answer']}\n\n" for turn in turns)
+        messages = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_words=int(self.summary_tokens * 0.75))},
+            {"role": "user", "content": (
+                f"EXISTING SUMMARY:\n{self.summary or '(none)'}\n\n"
+                f"NEW EXCHANGES:\n{exchanges}"
+            )}
+        ]
+        async with llm_scheduler.background_slot():
+            summary = await self.llm_model.generate_response(messages, max_tokens=self.summary_tokens)
+        return summary.strip()
+
+    def close(self):
+        if self._fold_task is not None and not self._fold_task.done():
+            self._fold_task.cancel()
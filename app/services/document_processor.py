@@ -10,7 +10,7 @@ from dataclasses import dataclass
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app.models.document import Document, DocumentStatus
-from app.services.document_store import DocumentStore
+from app.services.document_store import get_document_store
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -213,8 +213,8 @@ class DocumentProcessingService:
             db = SessionLocal()
             
             try:
-                # Initialize document store
-                document_store = DocumentStore(settings.OUTPUT_FOLDER)
+                # Reuse this pool process's store; writes always start from the latest generation
+                document_store = get_document_store()
                 
                 # Process the document
                 success = asyncio.run(
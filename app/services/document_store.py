@@ -3,80 +3,439 @@ import uuid
 import pickle
 import logging
 import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from typing import Dict, Optional, List
 from datetime import datetime
 from pathlib import Path
 import numpy as np
 import faiss
 import torch
+from filelock import FileLock
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from sqlalchemy.orm import Session
 from app.models.document import Document, DocumentStatus
+from app.services.chunk_store import ChunkFilter, ChunkStore
+from app.services.embedding_cache import EmbeddingCache, normalize_query
+from app.services.embedding_store import EmbeddingStore
+from app.services.retrieval_batcher import RetrievalBatcher
+from app.services.token_counter import count_tokens_batch
+from app.services.reranker import Reranker
+from app.services.index_factory import (
+    INDEX_FLAT, INDEX_IVF_FLAT, INDEX_IVF_PQ,
+    build_index, id_selector, index_type_of, min_training_size, reconstruct_vectors, search_parameters
+)
+from app.utils.metrics import metrics
 from app.config import settings
 import pandas as pd
 import docx
 
 logger = logging.getLogger(__name__)
 
+# Legacy single-file layout, imported into the chunk store on first start
+INDEX_FILENAME = "unified_faiss_index"
+METADATA_FILENAME = "unified_metadata.pickle"
+
+# Versioned index snapshots: CURRENT holds the generation readers should load
+SNAPSHOT_DIRNAME = "snapshots"
+CURRENT_FILENAME = "CURRENT"
+LOCK_FILENAME = "unified_store.lock"
+
+# Distinct search filters whose FAISS selectors are kept (roughly one per scoped chat session)
+FILTER_SELECTOR_CACHE_SIZE = 64
+
+@dataclass
+class IndexSnapshot:
+    """Consistent view of the FAISS index at one generation; never mutated once published"""
+    generation: int
+    index: faiss.Index
+    tombstones: frozenset = field(default_factory=frozenset)
+    tombstone_selector: Optional[faiss.IDSelector] = None
+
+@dataclass
+class SearchRequest:
+    query: str
+    k: int
+    submitted_at: float
+    chunk_filter: Optional[ChunkFilter] = None
+    embedding: Optional[np.ndarray] = None  # already embedded by the caller, e.g. for the answer cache
+
+@dataclass
+class SearchHit:
+    chunk_id: int
+    document_id: str
+    filename: Optional[str]
+    page: Optional[int]
+    text: str
+    distance: Optional[float]  # squared L2 distance to the query embedding
+    token_count: Optional[int] = None  # LLM tokens in text, recorded at ingestion
+
+@dataclass
+class SearchResult:
+    """Hits kept for the prompt, plus the ones the adaptive cutoff dropped"""
+    hits: List[SearchHit]
+    dropped: List[SearchHit] = field(default_factory=list)
+
+    @property
+    def texts(self) -> List[str]:
+        return [hit.text for hit in self.hits]
+
+    @property
+    def best_distance(self) -> Optional[float]:
+        distances = [hit.distance for hit in self.hits if hit.distance is not None]
+        return min(distances) if distances else None
+
+    def is_confident(self, max_distance: float) -> bool:
+        """True if some hit is close enough to the query to be worth sending to the LLM"""
+        if not self.hits:
+            return False
+        best = self.best_distance
+        # Without distances there is nothing to judge by, so let the LLM decide
+        return best is None or best <= max_distance
+
+def _read_generation(base_path: Path) -> int:
+    try:
+        return int((base_path / CURRENT_FILENAME).read_text().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def _snapshot_paths(base_path: Path, generation: int):
+    if generation == 0:
+        return base_path / INDEX_FILENAME, base_path / METADATA_FILENAME
+    snapshot_dir = base_path / SNAPSHOT_DIRNAME
+    return (
+        snapshot_dir / f"index.{generation}.faiss",
+        snapshot_dir / f"metadata.{generation}.pickle"
+    )
+
+def _atomic_write(path: Path, write_fn) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    write_fn(str(tmp_path))
+    os.replace(tmp_path, path)
+
 class DocumentStore:
     def __init__(self, base_path: str):
         logger.info(f"Initializing DocumentStore with base path: {base_path}")
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
-        self.index_path = self.base_path / "unified_faiss_index"
-        self.metadata_path = self.base_path / "unified_metadata.pickle"
+        (self.base_path / SNAPSHOT_DIRNAME).mkdir(exist_ok=True)
+        
+        # Serializes writers across the web workers and the processing pool
+        self._write_lock = FileLock(str(self.base_path / LOCK_FILENAME))
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+        self.embedding_store = EmbeddingStore(self.base_path)
+        self.chunk_store = ChunkStore(self.base_path)
+        # Embedding and FAISS search are CPU-bound; keep them off the event loop
+        self._retrieval_executor = ThreadPoolExecutor(
+            max_workers=settings.RETRIEVAL_WORKERS,
+            thread_name_prefix="Retrieval"
+        )
+        # A cross-encoder pass that overruns its budget keeps running; on its own thread it cannot hold up retrieval
+        self._rerank_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Rerank")
+        self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_SIZE)
+        self._filter_selectors: "OrderedDict[tuple, faiss.IDSelector]" = OrderedDict()
+        self._filter_lock = threading.Lock()
+        self._retrieval_batcher = RetrievalBatcher(
+            self._search_batch,
+            self._retrieval_executor,
+            max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_wait=settings.EMBEDDING_BATCH_WAIT_MS / 1000
+        )
+        self._embedding_batcher = RetrievalBatcher(
+            self._embed_query_batch,
+            self._retrieval_executor,
+            max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_wait=settings.EMBEDDING_BATCH_WAIT_MS / 1000
+        )
         
         self.embeddings = HuggingFaceEmbeddings(
             model_name=settings.EMBEDDINGS_MODEL,
             model_kwargs={'device': "cuda" if torch.cuda.is_available() else "cpu"}
         )
+        self.reranker = (
+            Reranker(settings.RERANK_MODEL, settings.RERANK_CACHE_SIZE)
+            if settings.RERANK_ENABLED else None
+        )
         
         self._initialize_storage()
 
+    @property
+    def index(self) -> faiss.Index:
+        return self._snapshot.index
+
+    @property
+    def generation(self) -> int:
+        return self._snapshot.generation
+
+    @property
+    def kb_version(self) -> int:
+        """Bumped whenever a document's content enters or leaves the knowledge base"""
+        return int(self.chunk_store.get_state('kb_version', '0'))
+
     def _initialize_storage(self):
         logger.info("Initializing unified knowledge base storage")
         try:
-            if self.index_path.exists() and self.metadata_path.exists():
-                logger.info("Loading existing unified index and metadata")
-                self.index = faiss.read_index(str(self.index_path))
-                with open(self.metadata_path, 'rb') as f:
-                    self.metadata = pickle.load(f)
-            else:
-                logger.info("Creating new unified index and metadata")
-                embedding_dim = len(self.embeddings.embed_query("test"))
-                self.index = faiss.IndexFlatL2(embedding_dim)
-                self.metadata = {
-                    'documents': {},
-                    'chunks': [],
-                    'id_mapping': {},
-                    'global_status': 'ready'
-                }
-                self._save_storage()
+            with self._write_lock:
+                generation = _read_generation(self.base_path)
+                index_path, metadata_path = _snapshot_paths(self.base_path, generation)
+                if index_path.exists():
+                    logger.info(f"Loading existing unified index (generation {generation})")
+                    snapshot = self._load_snapshot(generation)
+                    imported = False
+                    if self.chunk_store.get_state('layout_version') is None and metadata_path.exists():
+                        with self.chunk_store.transaction():
+                            self._import_legacy_metadata(snapshot, metadata_path)
+                            self._backfill_embeddings(snapshot)
+                            generation = self._write_snapshot(snapshot)
+                        self._publish_snapshot(snapshot, generation)
+                        imported = True
+                    if not imported:
+                        self._backfill_embeddings(snapshot)
+                        self._snapshot = snapshot
+                else:
+                    logger.info("Creating new unified index and chunk store")
+                    embedding_dim = len(self.embeddings.embed_query("test"))
+                    snapshot = IndexSnapshot(
+                        generation=generation,
+                        index=build_index(self._target_index_type(), embedding_dim)
+                    )
+                    with self.chunk_store.transaction():
+                        self.chunk_store.set_state('layout_version', 1)
+                        generation = self._write_snapshot(snapshot)
+                    self._publish_snapshot(snapshot, generation)
         except Exception as e:
             logger.error(f"Error initializing storage: {str(e)}")
             raise
 
-    def _save_storage(self):
-        logger.info("Saving unified storage")
+    def _load_snapshot(self, generation: int) -> IndexSnapshot:
+        index_path, _ = _snapshot_paths(self.base_path, generation)
+        index = faiss.read_index(str(index_path))
+        # Tombstones are committed before their generation is published, so reading them after
+        # the index yields at least the ones it needs
+        tombstones = self.chunk_store.tombstones()
+        return IndexSnapshot(
+            generation=generation,
+            index=index,
+            tombstones=tombstones,
+            tombstone_selector=id_selector(tombstones, exclude=True) if tombstones else None
+        )
+
+    def _import_legacy_metadata(self, snapshot: IndexSnapshot, metadata_path: Path):
+        """
+        Move pickled metadata into the chunk store. The oldest layout (chunk list +
+        id_mapping over a plain index) is converted to stable chunk ids over an
+        ID-mapped index, dropping vectors of deleted chunks.
+        """
+        logger.info(f"Importing legacy metadata from {metadata_path.name} into the chunk store")
+        with open(metadata_path, 'rb') as f:
+            metadata = pickle.load(f)
+        
+        if isinstance(metadata['chunks'], dict):
+            chunks = metadata['chunks']
+            next_chunk_id = metadata.get('next_chunk_id', max(chunks, default=-1) + 1)
+            tombstones = metadata.get('tombstones', set())
+        else:
+            id_mapping = metadata.get('id_mapping', {})
+            positions, vectors = reconstruct_vectors(snapshot.index)
+            
+            chunks = {}
+            keep = np.zeros(len(positions), dtype=bool)
+            for row, faiss_id in enumerate(positions.tolist()):
+                chunk_idx = id_mapping.get(faiss_id)
+                if chunk_idx is not None and chunk_idx < len(metadata['chunks']):
+                    chunks[faiss_id] = metadata['chunks'][chunk_idx]
+                    keep[row] = True
+            
+            index = build_index(index_type_of(snapshot.index), snapshot.index.d, vectors[keep])
+            if keep.any():
+                index.add_with_ids(vectors[keep], positions[keep])
+            snapshot.index = index
+            next_chunk_id = int(positions.max()) + 1 if len(positions) else 0
+            tombstones = set()
+        
+        for document_id, document_info in metadata['documents'].items():
+            self.chunk_store.upsert_document(
+                document_id,
+                filename=document_info.get('filename'),
+                status=document_info.get('status', DocumentStatus.PROCESSING),
+                error=document_info.get('error'),
+                chunk_count=document_info.get('chunk_count', 0),
+                created_at=document_info.get('created_at')
+            )
+        self.chunk_store.add_chunks(
+            {
+                'chunk_id': chunk_id,
+                'document_id': chunk.get('document_id'),
+                'filename': chunk.get('filename'),
+                'page': chunk.get('page', 0),
+                'chunk_index': chunk.get('chunk_index', 0),
+                'text': chunk['text']
+            }
+            for chunk_id, chunk in chunks.items()
+        )
+        self.chunk_store.set_state('next_chunk_id', next_chunk_id)
+        self.chunk_store.add_tombstones(list(tombstones))
+        self.chunk_store.set_state('layout_version', 1)
+        logger.info(f"Imported {len(metadata['documents'])} documents and {len(chunks)} chunks")
+
+    def _backfill_embeddings(self, snapshot: IndexSnapshot):
+        """One-time copy of vectors out of an index created before embeddings were persisted"""
+        if self.embedding_store.rows > 0 or snapshot.index.ntotal == 0:
+            return
+        
+        if index_type_of(snapshot.index) == INDEX_IVF_PQ:
+            logger.warning("Backfilling embeddings from an IVF-PQ index; vectors are approximate until re-embedded")
+        logger.info(f"Persisting {snapshot.index.ntotal} chunk embeddings from the existing index")
+        ids, vectors = reconstruct_vectors(snapshot.index)
+        self.embedding_store.write(ids, vectors, settings.EMBEDDINGS_MODEL)
+
+    def _stored_vectors(self, snapshot: IndexSnapshot, chunk_ids: List[int]) -> np.ndarray:
+        try:
+            return self.embedding_store.read(chunk_ids)
+        except KeyError:
+            logger.warning("Embedding store incomplete; reconstructing vectors from the index")
+            ids, vectors = reconstruct_vectors(snapshot.index)
+            row_of = {chunk_id: row for row, chunk_id in enumerate(ids.tolist())}
+            return vectors[[row_of[chunk_id] for chunk_id in chunk_ids]]
+
+    def _write_snapshot(self, snapshot: IndexSnapshot) -> int:
+        """
+        Write snapshot's index as the next generation without publishing it; returns the generation.
+        Call inside the chunk store transaction, so a failed write rolls the chunk changes back.
+        Caller must hold the write lock.
+        """
+        logger.info("Saving unified index")
         try:
-            faiss.write_index(self.index, str(self.index_path))
-            with open(self.metadata_path, 'wb') as f:
-                pickle.dump(self.metadata, f)
+            generation = _read_generation(self.base_path) + 1
+            index_path, _ = _snapshot_paths(self.base_path, generation)
+            _atomic_write(index_path, lambda path: faiss.write_index(snapshot.index, path))
+            return generation
         except Exception as e:
-            logger.error(f"Error saving storage: {str(e)}")
+            logger.error(f"Error saving index: {str(e)}")
             raise
 
+    def _publish_snapshot(self, snapshot: IndexSnapshot, generation: int):
+        """
+        Make a written generation current. Call only after the chunk store transaction has committed:
+        a reader that loads the generation then sees its chunks and tombstones, and a failed commit
+        never leaves a published index holding chunk ids that were rolled back.
+        """
+        try:
+            # Flipping CURRENT is the commit point readers watch for
+            _atomic_write(
+                self.base_path / CURRENT_FILENAME,
+                lambda path: Path(path).write_text(str(generation))
+            )
+            
+            snapshot.generation = generation
+            snapshot.tombstones = self.chunk_store.tombstones()
+            snapshot.tombstone_selector = (
+                id_selector(snapshot.tombstones, exclude=True) if snapshot.tombstones else None
+            )
+            self._snapshot = snapshot
+            self._prune_snapshots(generation)
+        except Exception as e:
+            logger.error(f"Error publishing index generation {generation}: {str(e)}")
+            raise
+
+    def _prune_snapshots(self, generation: int):
+        keep_from = generation - max(1, settings.INDEX_SNAPSHOT_RETENTION) + 1
+        for path in (self.base_path / SNAPSHOT_DIRNAME).iterdir():
+            parts = path.name.split('.')
+            if len(parts) >= 3 and parts[1].isdigit() and int(parts[1]) < keep_from:
+                try:
+                    path.unlink()
+                except OSError:
+                    # Still open by a reader on some platforms; retried on the next save
+                    pass
+
+    @contextmanager
+    def _writable_snapshot(self):
+        """
+        Yield a private copy of the latest index generation inside a chunk store transaction.
+        On exit the new index file is written, the transaction committed, and only then is the
+        generation published, so readers keep using the live snapshot until the chunk store
+        matches the new one and never see a half-applied change.
+        """
+        with self._write_lock:
+            with self.chunk_store.transaction():
+                snapshot = self._load_snapshot(_read_generation(self.base_path))
+                yield snapshot
+                generation = self._write_snapshot(snapshot)
+            self._publish_snapshot(snapshot, generation)
+
+    def refresh(self) -> bool:
+        """Swap in the latest published generation if it changed; returns True on swap"""
+        generation = _read_generation(self.base_path)
+        if self._snapshot is not None and generation == self._snapshot.generation:
+            return False
+        
+        try:
+            snapshot = self._load_snapshot(generation)
+        except Exception as e:
+            logger.error(f"Error loading index generation {generation}: {str(e)}")
+            return False
+        
+        if self._snapshot is None or snapshot.generation > self._snapshot.generation:
+            self._snapshot = snapshot
+            logger.info(f"Swapped in unified index generation {generation}")
+            return True
+        return False
+
+    def start_watcher(self, interval: Optional[float] = None):
+        """Poll CURRENT in a background thread and hot-swap new generations"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        
+        interval = interval or settings.INDEX_RELOAD_INTERVAL
+        self._watcher_stop.clear()
+        
+        def watch():
+            while not self._watcher_stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Error in index watcher: {str(e)}")
+        
+        self._watcher = threading.Thread(target=watch, name="IndexWatcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"Index watcher started (interval {interval}s)")
+
+    def stop_watcher(self):
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def close(self):
+        self.stop_watcher()
+        self._retrieval_executor.shutdown(wait=False, cancel_futures=True)
+        self._rerank_executor.shutdown(wait=False, cancel_futures=True)
+
     async def add_document(self, document_id: str, filename: str) -> None:
         logger.info(f"Adding document {document_id} with filename {filename} to unified knowledge base")
-        self.metadata['documents'][document_id] = {
-            'status': DocumentStatus.PROCESSING,
-            'chunks': [],
-            'filename': filename,
-            'created_at': datetime.utcnow().isoformat()
-        }
-        self._save_storage()
+        # The write lock can be held for a whole index write or IVF training, so wait for it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._register_document, document_id, filename)
+
+    def _register_document(self, document_id: str, filename: str):
+        # Status-only change: a chunk store row, no new index generation
+        with self._write_lock:
+            self.chunk_store.upsert_document(
+                document_id,
+                filename=filename,
+                status=DocumentStatus.PROCESSING,
+                error=None,
+                chunk_count=0,
+                created_at=datetime.utcnow().isoformat()
+            )
 
     def _load_document_by_type(self, file_path: str, file_type: str):
         """Load document based on file type"""
@@ -136,34 +495,48 @@ class DocumentStore:
             chunk_texts = [chunk.page_content for chunk in chunks]
             logger.info("Creating embeddings for unified knowledge base")
             embeddings = self.embeddings.embed_documents(chunk_texts)
+            # Counted once here so prompt packing never tokenizes chunk text at query time
+            token_counts = count_tokens_batch(chunk_texts)
+            filename = db_document.original_filename if db_document else 'unknown'
             
             logger.info("Adding to unified FAISS index")
-            start_idx = self.index.ntotal
-            self.index.add(np.array(embeddings))
-            
-            chunk_metadata = []
-            for i, chunk in enumerate(chunks):
-                faiss_id = start_idx + i
-                chunk_info = {
-                    'text': chunk.page_content,
-                    'page': chunk.metadata.get('page', 0),
-                    'document_id': document_id,
-                    'filename': db_document.original_filename if db_document else 'unknown',
-                    'chunk_index': i
-                }
+            with self._writable_snapshot() as snapshot:
+                # A retried document replaces whatever an earlier attempt managed to add
+                previous_ids = self.chunk_store.document_chunk_ids(document_id)
+                if previous_ids:
+                    self._remove_chunks(snapshot, previous_ids)
                 
-                self.metadata['id_mapping'][faiss_id] = len(self.metadata['chunks'])
-                self.metadata['chunks'].append(chunk_info)
-                chunk_metadata.append(chunk_info)
-            
-            logger.info("Updating unified knowledge base metadata")
-            self.metadata['documents'][document_id].update({
-                'status': DocumentStatus.COMPLETED,
-                'chunks': chunk_metadata,
-                'chunk_count': len(chunks)
-            })
-            
-            self._save_storage()
+                chunk_ids = self.chunk_store.allocate_chunk_ids(len(chunks))
+                if chunk_ids:
+                    snapshot.index.add_with_ids(
+                        np.array(embeddings, dtype='float32'),
+                        np.array(chunk_ids, dtype='int64')
+                    )
+                self.embedding_store.write(chunk_ids, embeddings, settings.EMBEDDINGS_MODEL)
+                
+                self.chunk_store.add_chunks(
+                    {
+                        'chunk_id': chunk_id,
+                        'document_id': document_id,
+                        'filename': filename,
+                        'page': chunk.metadata.get('page', 0),
+                        'chunk_index': i,
+                        'text': chunk.page_content,
+                        'token_count': token_count
+                    }
+                    for i, (chunk_id, chunk, token_count) in enumerate(zip(chunk_ids, chunks, token_counts))
+                )
+                
+                self._maybe_upgrade_index(snapshot)
+                
+                logger.info("Updating unified knowledge base metadata")
+                self.chunk_store.upsert_document(
+                    document_id,
+                    status=DocumentStatus.COMPLETED,
+                    error=None,
+                    chunk_count=len(chunks)
+                )
+                self.chunk_store.bump_kb_version()
             
             if db_document:
                 db_document.status = DocumentStatus.COMPLETED
@@ -175,9 +548,12 @@ class DocumentStore:
             
         except Exception as e:
             logger.error(f"Error processing document: {str(e)}")
-            self.metadata['documents'][document_id]['status'] = DocumentStatus.FAILED
-            self.metadata['documents'][document_id]['error'] = str(e)
-            self._save_storage()
+            with self._write_lock:
+                self.chunk_store.upsert_document(
+                    document_id,
+                    status=DocumentStatus.FAILED,
+                    error=str(e)
+                )
             
             if db_document:
                 db_document.status = DocumentStatus.FAILED
@@ -186,105 +562,483 @@ class DocumentStore:
             
             return False
 
-    async def search(self, query: str, k: int = 4) -> List[str]:
-        """Search across the entire unified knowledge base"""
+    async def search(self, query: str, k: int = 4, chunk_filter: Optional[ChunkFilter] = None,
+                     adaptive: bool = True, query_embedding: Optional[np.ndarray] = None) -> SearchResult:
+        """
+        Search across the entire unified knowledge base without blocking the event loop.
+        Concurrent searches are micro-batched into one embedding pass and one FAISS call.
+        A query_embedding from embed_query is used as is instead of embedding the query again.
+        A chunk_filter restricts results to matching documents inside the FAISS search itself.
+        With reranking enabled a wider candidate set is retrieved and the top k are picked by the cross-encoder.
+        With adaptive set, hits far from the best match are dropped so weak matches stay out of the prompt.
+        """
+        if self.reranker is None:
+            hits = await self._retrieval_batcher.submit(
+                SearchRequest(query, k, time.perf_counter(), chunk_filter, query_embedding)
+            )
+        else:
+            candidates = await self._retrieval_batcher.submit(
+                SearchRequest(query, max(k, settings.RERANK_CANDIDATES), time.perf_counter(), chunk_filter, query_embedding)
+            )
+            hits = await self._rerank(query, candidates, k)
+        
+        if not adaptive or not settings.ADAPTIVE_K:
+            return SearchResult(hits)
+        result = apply_distance_cutoff(
+            hits,
+            min_hits=settings.ADAPTIVE_K_MIN,
+            margin=settings.DISTANCE_CUTOFF_MARGIN,
+            absolute=settings.DISTANCE_CUTOFF_ABSOLUTE
+        )
+        metrics.increment('retrieval.hits_dropped', len(result.dropped))
+        return result
+
+    async def _rerank(self, query: str, hits: List[SearchHit], k: int) -> List[SearchHit]:
+        """Order hits by cross-encoder score; past the time budget, keep the retrieval order"""
+        if len(hits) <= 1:
+            return hits[:k]
+        
+        started_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        scoring = loop.run_in_executor(self._rerank_executor, self.reranker.score, query, hits)
         try:
-            if self.index.ntotal == 0:
+            scores = await asyncio.wait_for(scoring, timeout=settings.RERANK_TIMEOUT_MS / 1000)
+        except asyncio.TimeoutError:
+            # The forward pass still finishes in the background and fills the score cache for a retry
+            metrics.increment('rerank.timeouts')
+            logger.warning(f"Rerank exceeded {settings.RERANK_TIMEOUT_MS} ms budget; using retrieval order")
+            return hits[:k]
+        except Exception as e:
+            metrics.increment('rerank.errors')
+            logger.error(f"Error reranking search results: {str(e)}")
+            return hits[:k]
+        
+        metrics.observe('rerank.score', time.perf_counter() - started_at)
+        order = sorted(range(len(hits)), key=lambda position: scores[position], reverse=True)
+        return [hits[position] for position in order[:k]]
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed one query on the retrieval pool. Concurrent calls are micro-batched into one forward
+        pass; pass the result to search() so the query is not embedded twice.
+        """
+        return await self._embedding_batcher.submit(query)
+
+    def _embed_query_batch(self, queries: List[str]) -> List[np.ndarray]:
+        return list(self._embed_queries(queries))
+
+    def _search_batch(self, requests: List[SearchRequest]) -> List[List[SearchHit]]:
+        started_at = time.perf_counter()
+        for request in requests:
+            metrics.observe('retrieval.queue_wait', started_at - request.submitted_at)
+        metrics.increment('retrieval.batches')
+        metrics.increment('retrieval.queries', len(requests))
+        
+        try:
+            # Pin one generation for the whole batch so a concurrent swap cannot change the index under us
+            snapshot = self._snapshot
+            if snapshot.index.ntotal == 0:
                 logger.warning("No documents in unified knowledge base")
-                return []
+                return [[] for _ in requests]
             
-            query_embedding = self.embeddings.embed_query(query)
+            query_embeddings = self._request_embeddings(requests)
             
-            D, I = self.index.search(np.array([query_embedding]), k)
+            # With hybrid search each retriever contributes a deeper candidate list to the fusion
+            depths = [
+                max(request.k, settings.HYBRID_CANDIDATES) if settings.HYBRID_SEARCH else request.k
+                for request in requests
+            ]
+            vector_ids: List[List[int]] = [[] for _ in requests]
+            distances: List[Dict[int, float]] = [{} for _ in requests]
+            # Requests sharing a filter (usually none) share one FAISS call with the same selector
+            groups: Dict[Optional[ChunkFilter], List[int]] = {}
+            for row, request in enumerate(requests):
+                groups.setdefault(request.chunk_filter, []).append(row)
+            for chunk_filter, rows in groups.items():
+                selector = self._filter_selector(snapshot, chunk_filter)
+                if selector is False:
+                    continue
+                D, I = snapshot.index.search(
+                    query_embeddings[rows],
+                    max(depths[row] for row in rows),
+                    params=search_parameters(snapshot.index, selector=selector)
+                )
+                for position, row in enumerate(rows):
+                    vector_ids[row] = [int(idx) for idx in I[position][:depths[row]] if idx != -1]
+                    distances[row] = {
+                        int(idx): float(distance)
+                        for idx, distance in zip(I[position][:depths[row]], D[position][:depths[row]]) if idx != -1
+                    }
             
-            relevant_chunks = []
-            for idx in I[0]:
-                if idx != -1 and idx in self.metadata['id_mapping']:
-                    chunk_idx = self.metadata['id_mapping'][int(idx)]
-                    if chunk_idx < len(self.metadata['chunks']):
-                        chunk = self.metadata['chunks'][chunk_idx]
-                        relevant_chunks.append(chunk['text'])
+            hit_ids = []
+            for row, request in enumerate(requests):
+                ranked = vector_ids[row]
+                if settings.HYBRID_SEARCH:
+                    keyword_started_at = time.perf_counter()
+                    keyword_ids = self.chunk_store.keyword_search(
+                        request.query,
+                        depths[row],
+                        request.chunk_filter,
+                        max_terms=settings.KEYWORD_MAX_TERMS,
+                        max_postings=settings.KEYWORD_MAX_POSTINGS
+                    )
+                    metrics.observe('retrieval.keyword_search', time.perf_counter() - keyword_started_at)
+                    ranked = reciprocal_rank_fusion([ranked, keyword_ids], settings.RRF_K)
+                hit_ids.append(ranked[:request.k])
             
-            logger.info(f"Found {len(relevant_chunks)} relevant chunks from unified knowledge base")
-            return relevant_chunks
+            # Only the hits' text is read from the chunk store, in one lookup for the whole batch
+            chunks = self.chunk_store.get_chunks(sorted({chunk_id for ids in hit_ids for chunk_id in ids}))
+            self._fill_keyword_distances(query_embeddings, hit_ids, distances)
+            results = [
+                [
+                    SearchHit(
+                        chunk_id=chunk_id,
+                        document_id=chunks[chunk_id]['document_id'],
+                        filename=chunks[chunk_id]['filename'],
+                        page=chunks[chunk_id]['page'],
+                        text=chunks[chunk_id]['text'],
+                        distance=distances[row].get(chunk_id),
+                        token_count=chunks[chunk_id]['token_count']
+                    )
+                    for chunk_id in ids if chunk_id in chunks
+                ]
+                for row, ids in enumerate(hit_ids)
+            ]
+            
+            metrics.observe('retrieval.search', time.perf_counter() - started_at)
+            logger.info(
+                f"Searched unified knowledge base for {len(requests)} queries in one batch "
+                f"(max queue wait {(started_at - min(r.submitted_at for r in requests)) * 1000:.1f} ms)"
+            )
+            return results
                         
         except Exception as e:
             logger.error(f"Error searching unified knowledge base: {str(e)}")
-            return []
+            return [[] for _ in requests]
+
+    def _request_embeddings(self, requests: List[SearchRequest]) -> np.ndarray:
+        """One row per request; only requests that arrive without an embedding are embedded"""
+        missing = [row for row, request in enumerate(requests) if request.embedding is None]
+        embedded = dict(zip(missing, self._embed_queries([requests[row].query for row in missing]))) if missing else {}
+        return np.stack([
+            embedded[row] if request.embedding is None else np.asarray(request.embedding, dtype='float32')
+            for row, request in enumerate(requests)
+        ])
+
+    def _fill_keyword_distances(self, query_embeddings: np.ndarray, hit_ids: List[List[int]],
+                                distances: List[Dict[int, float]]):
+        """Give keyword-only hits a vector distance from their stored embeddings, so every hit can be cut off alike"""
+        for row, ids in enumerate(hit_ids):
+            missing = [chunk_id for chunk_id in ids if chunk_id not in distances[row]]
+            if not missing:
+                continue
+            try:
+                vectors = self.embedding_store.read(missing)
+            except KeyError:
+                continue
+            squared = np.sum((vectors - query_embeddings[row]) ** 2, axis=1)
+            distances[row].update(zip(missing, squared.tolist()))
+
+    def _filter_selector(self, snapshot: IndexSnapshot, chunk_filter: Optional[ChunkFilter]):
+        """
+        FAISS selector admitting only chunks that pass the filter, so filtering happens inside the
+        search and a filtered query still returns a full k. Returns False when nothing can match.
+        Selectors are cached per filter until the index generation or knowledge base version moves.
+        """
+        if chunk_filter is None or chunk_filter.is_empty():
+            return snapshot.tombstone_selector
+        
+        key = (chunk_filter, snapshot.generation, self.kb_version)
+        with self._filter_lock:
+            selector = self._filter_selectors.get(key)
+            if selector is not None:
+                self._filter_selectors.move_to_end(key)
+                return selector
+        
+        # Tombstoned chunks are already gone from the chunk store, so the allow-list excludes them
+        chunk_ids = self.chunk_store.filter_chunk_ids(chunk_filter)
+        selector = id_selector(chunk_ids) if chunk_ids else False
+        with self._filter_lock:
+            self._filter_selectors[key] = selector
+            while len(self._filter_selectors) > FILTER_SELECTOR_CACHE_SIZE:
+                self._filter_selectors.popitem(last=False)
+        return selector
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries through the LRU cache; only distinct misses reach the transformer"""
+        keys = [normalize_query(query) for query in queries]
+        vectors = {}
+        misses = []
+        for key in keys:
+            if key in vectors or key in misses:
+                continue
+            cached = self.embedding_cache.get(key)
+            if cached is None:
+                misses.append(key)
+            else:
+                vectors[key] = cached
+        
+        if misses:
+            # embed_documents encodes exactly like embed_query, but as a single forward pass
+            for key, vector in zip(misses, self.embeddings.embed_documents(misses)):
+                vector = np.asarray(vector, dtype='float32')
+                vectors[key] = vector
+                self.embedding_cache.put(key, vector)
+        
+        return np.stack([vectors[key] for key in keys])
 
     def get_document_status(self, document_id: str) -> Optional[Dict]:
         """Get document processing status from unified knowledge base"""
-        return self.metadata['documents'].get(document_id)
+        return self.chunk_store.get_document(document_id)
 
     def get_knowledge_base_status(self) -> Dict:
         """Get overall knowledge base status"""
-        total_documents = len(self.metadata['documents'])
-        completed_documents = len([doc for doc in self.metadata['documents'].values() 
-                                 if doc['status'] == DocumentStatus.COMPLETED])
-        total_chunks = len(self.metadata['chunks'])
+        return _summarize_knowledge_base(self.chunk_store)
+
+    def _remove_chunks(self, snapshot: IndexSnapshot, chunk_ids: List[int]):
+        """Drop chunks and their vectors; cost scales with len(chunk_ids), not the corpus"""
+        self.chunk_store.delete_chunks(chunk_ids)
         
-        return {
-            'status': self.metadata['global_status'],
-            'total_documents': total_documents,
-            'completed_documents': completed_documents,
-            'total_chunks': total_chunks,
-            'last_updated': datetime.utcnow().isoformat()
-        }
+        try:
+            snapshot.index.remove_ids(np.array(chunk_ids, dtype='int64'))
+        except RuntimeError:
+            # HNSW cannot remove vectors; exclude them at search time until the next rebuild
+            self.chunk_store.add_tombstones(chunk_ids)
 
     def delete_document(self, document_id: str) -> bool:
         """Delete document from unified knowledge base"""
         try:
-            if document_id in self.metadata['documents']:
+            if self.chunk_store.get_document(document_id) is None:
+                return False
+            
+            with self._writable_snapshot() as snapshot:
                 logger.info(f"Removing document {document_id} from unified knowledge base")
-                
-                chunks_to_remove = []
-                for i, chunk in enumerate(self.metadata['chunks']):
-                    if chunk.get('document_id') == document_id:
-                        chunks_to_remove.append(i)
-                
-                for chunk_idx in reversed(chunks_to_remove):
-                    del self.metadata['chunks'][chunk_idx]
-                
-                keys_to_remove = []
-                for faiss_id, chunk_idx in self.metadata['id_mapping'].items():
-                    if chunk_idx in chunks_to_remove or chunk_idx >= len(self.metadata['chunks']):
-                        keys_to_remove.append(faiss_id)
-                
-                for key in keys_to_remove:
-                    del self.metadata['id_mapping'][key]
-                
-                del self.metadata['documents'][document_id]
-                
-                logger.warning(f"Document {document_id} removed from metadata. FAISS index rebuild recommended for optimal performance.")
-                
-                self._save_storage()
-                return True
-            return False
+                chunk_ids = self.chunk_store.delete_document(document_id)
+                if chunk_ids:
+                    self._remove_chunks(snapshot, chunk_ids)
+                self.chunk_store.bump_kb_version()
+            
+            logger.info(f"Document {document_id} removed with {len(chunk_ids)} chunks")
+            return True
         except Exception as e:
             logger.error(f"Error deleting document: {str(e)}")
             return False
 
-    def rebuild_index(self):
-        """Rebuild FAISS index from current chunks (optional maintenance operation)"""
+    def rebuild_index(self, reembed: bool = False) -> Dict:
+        """
+        Rebuild the FAISS index from the persisted chunk embeddings, compacting deleted vectors.
+        Pass reembed=True (or change EMBEDDINGS_MODEL) to recompute every embedding from text.
+        """
         try:
             logger.info("Rebuilding unified FAISS index")
             
-            if not self.metadata['chunks']:
+            if self.chunk_store.chunk_count() == 0:
                 logger.info("No chunks to rebuild index from")
-                return
-            
-            chunk_texts = [chunk['text'] for chunk in self.metadata['chunks']]
-            embeddings = self.embeddings.embed_documents(chunk_texts)
+                return {'index_type': index_type_of(self.index), 'total_vectors': 0, 'reembedded': False}
             
-            embedding_dim = len(embeddings[0])
-            self.index = faiss.IndexFlatL2(embedding_dim)
-            self.index.add(np.array(embeddings))
+            reembed = reembed or self.embedding_store.model != settings.EMBEDDINGS_MODEL
+            if reembed:
+                # Embedding is the slow part, so it runs outside the write lock
+                chunk_ids = self.chunk_store.all_chunk_ids()
+                vectors = self._embed_chunks(chunk_ids)
             
-            self.metadata['id_mapping'] = {i: i for i in range(len(self.metadata['chunks']))}
+            with self._writable_snapshot() as snapshot:
+                if reembed:
+                    self.embedding_store.reset(vectors.shape[1], settings.EMBEDDINGS_MODEL)
+                    self.embedding_store.write(chunk_ids, vectors, settings.EMBEDDINGS_MODEL)
+                    # Chunks ingested while we were embedding need vectors from the new model too
+                    embedded_ids = set(chunk_ids)
+                    missing = [chunk_id for chunk_id in self.chunk_store.all_chunk_ids() if chunk_id not in embedded_ids]
+                    if missing:
+                        self.embedding_store.write(missing, self._embed_chunks(missing), settings.EMBEDDINGS_MODEL)
+                
+                live_ids = self.chunk_store.all_chunk_ids()
+                live_vectors = self.embedding_store.read(live_ids)
+                snapshot.index = build_index(self._target_index_type(), live_vectors.shape[1], live_vectors)
+                snapshot.index.add_with_ids(live_vectors, np.array(live_ids, dtype='int64'))
+                self._record_training(snapshot.index, len(live_ids))
+                self.chunk_store.clear_tombstones()
+                result = {
+                    'index_type': index_type_of(snapshot.index),
+                    'total_vectors': snapshot.index.ntotal,
+                    'reembedded': reembed
+                }
             
-            self._save_storage()
             logger.info("FAISS index rebuilt successfully")
+            return result
             
         except Exception as e:
             logger.error(f"Error rebuilding index: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def _embed_chunks(self, chunk_ids: List[int]) -> np.ndarray:
+        logger.info(f"Re-embedding {len(chunk_ids)} chunks with {settings.EMBEDDINGS_MODEL}")
+        vectors = []
+        batch_size = 1000
+        for start in range(0, len(chunk_ids), batch_size):
+            batch = chunk_ids[start:start + batch_size]
+            chunks = self.chunk_store.get_chunks(batch)
+            vectors.extend(self.embeddings.embed_documents([chunks[chunk_id]['text'] for chunk_id in batch]))
+        return np.array(vectors, dtype='float32')
+
+    def _maybe_upgrade_index(self, snapshot: IndexSnapshot):
+        """
+        IVF indexes cannot be trained on a small corpus; switch over from flat once enough vectors
+        exist, then retrain whenever the corpus has grown IVF_RETRAIN_GROWTH times past the training
+        set, so nlist keeps up with the corpus and the lists stay balanced
+        """
+        target = self._target_index_type()
+        if target not in (INDEX_IVF_FLAT, INDEX_IVF_PQ):
+            return
+        
+        total = snapshot.index.ntotal
+        current = index_type_of(snapshot.index)
+        if current == INDEX_FLAT:
+            if total < min_training_size(target):
+                return
+            logger.info(f"Corpus reached {total} vectors; upgrading flat index to {target}")
+        elif current == target:
+            # Indexes trained before the training size was recorded count as trained on nothing
+            trained_on = int(self.chunk_store.get_state('index_trained_on', '0'))
+            if settings.IVF_RETRAIN_GROWTH <= 0 or total < trained_on * settings.IVF_RETRAIN_GROWTH:
+                return
+            logger.info(f"Corpus grew to {total} vectors from {trained_on} at training; retraining {target} index")
+        else:
+            return
+        self._migrate_snapshot(snapshot, target)
+
+    def _migrate_snapshot(self, snapshot: IndexSnapshot, index_type: str):
+        # Only live chunks are re-added, keeping their ids, so tombstoned vectors are compacted away
+        ids = np.array(self.chunk_store.all_chunk_ids(), dtype='int64')
+        vectors = self._stored_vectors(snapshot, ids.tolist())
+        
+        new_index = build_index(index_type, snapshot.index.d, vectors)
+        if len(ids):
+            new_index.add_with_ids(vectors, ids)
+        snapshot.index = new_index
+        self._record_training(new_index, len(ids))
+        self.chunk_store.clear_tombstones()
+
+    def _target_index_type(self) -> str:
+        """
+        The index type to build: the one last chosen through migrate_index, unless INDEX_TYPE
+        has been changed since, in which case the new setting wins
+        """
+        configured = settings.INDEX_TYPE.lower()
+        if self.chunk_store.get_state('index_type_setting') != configured:
+            return configured
+        return self.chunk_store.get_state('index_type', configured)
+
+    def _record_training(self, index: faiss.Index, num_vectors: int):
+        """Remember how many vectors an IVF index was trained on, for the retrain check"""
+        if index_type_of(index) in (INDEX_IVF_FLAT, INDEX_IVF_PQ):
+            self.chunk_store.set_state('index_trained_on', num_vectors)
+
+    def migrate_index(self, index_type: Optional[str] = None) -> Dict:
+        """Convert the unified index to another type in place, without re-embedding any text"""
+        index_type = (index_type or self._target_index_type()).lower()
+        logger.info(f"Migrating unified FAISS index to {index_type}")
+        
+        with self._writable_snapshot() as snapshot:
+            previous_type = index_type_of(snapshot.index)
+            self._migrate_snapshot(snapshot, index_type)
+            # Later rebuilds and upgrades keep this type instead of reverting to INDEX_TYPE
+            self.chunk_store.set_state('index_type', index_type)
+            self.chunk_store.set_state('index_type_setting', settings.INDEX_TYPE.lower())
+            result = {
+                'previous_type': previous_type,
+                'index_type': index_type_of(snapshot.index),
+                'total_vectors': snapshot.index.ntotal
+            }
+        
+        logger.info(f"Unified FAISS index migrated from {result['previous_type']} to {result['index_type']}")
+        return result
+
+def apply_distance_cutoff(hits: List[SearchHit], min_hits: int, margin: float, absolute: float) -> SearchResult:
+    """
+    Keep the first min_hits hits, then only those within margin of the best distance and, when
+    absolute is positive, under that distance. Hit order is preserved; hits without a distance are kept.
+    The margin is additive: a ratio collapses to zero when the best hit nearly repeats the question.
+    """
+    known = [hit.distance for hit in hits if hit.distance is not None]
+    if not known:
+        return SearchResult(hits)
+    limit = min(known) + margin
+    if absolute > 0:
+        limit = min(limit, absolute)
+    
+    result = SearchResult([])
+    for position, hit in enumerate(hits):
+        if position < min_hits or hit.distance is None or hit.distance <= limit:
+            result.hits.append(hit)
+        else:
+            result.dropped.append(hit)
+    return result
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """Merge ranked id lists by summing 1 / (k + rank); ids ranked well by several lists rise to the top"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def _summarize_knowledge_base(chunk_store: ChunkStore) -> Dict:
+    stats = chunk_store.stats() if chunk_store.exists() else {
+        'total_documents': 0,
+        'completed_documents': 0,
+        'total_chunks': 0
+    }
+    
+    return {
+        'status': 'ready',
+        'total_documents': stats['total_documents'],
+        'completed_documents': stats['completed_documents'],
+        'total_chunks': stats['total_chunks'],
+        'last_updated': datetime.utcnow().isoformat()
+    }
+
+# Process-wide registry so every router in a worker shares one embedding model and index
+_store_registry: Dict[str, DocumentStore] = {}
+_store_registry_lock = threading.Lock()
+
+def get_document_store(base_path: Optional[str] = None) -> DocumentStore:
+    """Return the shared DocumentStore for base_path, creating it on first use"""
+    key = str(Path(base_path or settings.OUTPUT_FOLDER).resolve())
+    store = _store_registry.get(key)
+    if store is None:
+        with _store_registry_lock:
+            store = _store_registry.get(key)
+            if store is None:
+                store = DocumentStore(key)
+                store.start_watcher()
+                _store_registry[key] = store
+    return store
+
+def close_document_stores():
+    """Stop watchers and retrieval threads of every shared store"""
+    with _store_registry_lock:
+        for store in _store_registry.values():
+            store.close()
+        _store_registry.clear()
+
+# Read-only chunk store access for status polls; never loads the embedding model or the index
+_readonly_stores: Dict[str, ChunkStore] = {}
+
+def _readonly_chunk_store(base_path: Optional[str] = None) -> ChunkStore:
+    key = str(Path(base_path or settings.OUTPUT_FOLDER).resolve())
+    store = _readonly_stores.get(key)
+    if store is None:
+        store = _readonly_stores.setdefault(key, ChunkStore(Path(key), readonly=True))
+    return store
+
+def read_document_status(document_id: str, base_path: Optional[str] = None) -> Optional[Dict]:
+    """Get document status straight from the chunk store without a DocumentStore"""
+    chunk_store = _readonly_chunk_store(base_path)
+    if not chunk_store.exists():
+        return None
+    return chunk_store.get_document(document_id)
+
+def read_knowledge_base_status(base_path: Optional[str] = None) -> Dict:
+    """Get overall knowledge base status straight from the chunk store"""
+    return _summarize_knowledge_base(_readonly_chunk_store(base_path))
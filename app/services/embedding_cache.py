@@ -0,0 +1,65 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+from app.utils.metrics import metrics
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Collapse case, whitespace and trailing punctuation so near-identical questions share an entry"""
+    return _WHITESPACE.sub(" ", text).strip().lower().rstrip("?!. ")
+
+class EmbeddingCache:
+    """Bounded LRU map of normalized query text to its embedding vector; safe across retrieval threads"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max(0, max_size)
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.increment('embedding_cache.hits' if vector is not None else 'embedding_cache.misses')
+        return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if self.max_size == 0:
+            return
+        evicted = 0
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+            size = len(self._entries)
+        if evicted:
+            metrics.increment('embedding_cache.evictions', evicted)
+        metrics.set_gauge('embedding_cache.size', size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        metrics.set_gauge('embedding_cache.size', 0)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
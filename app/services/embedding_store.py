@@ -0,0 +1,95 @@
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Iterable, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILENAME = "chunk_embeddings.f16"
+EMBEDDINGS_INFO_FILENAME = "chunk_embeddings.json"
+
+class EmbeddingStore:
+    """
+    Chunk embeddings persisted as a float16 matrix where row i holds chunk id i.
+    Lets the FAISS index be rebuilt, compacted or migrated without re-embedding text.
+    Writes must happen under the DocumentStore write lock.
+    """
+    dtype = np.float16
+
+    def __init__(self, base_path: Path):
+        self.path = Path(base_path) / EMBEDDINGS_FILENAME
+        self.info_path = Path(base_path) / EMBEDDINGS_INFO_FILENAME
+        self.dim: Optional[int] = None
+        self.model: Optional[str] = None
+        self._load_info()
+
+    def _load_info(self):
+        try:
+            info = json.loads(self.info_path.read_text())
+            self.dim = info['dim']
+            self.model = info['model']
+        except (FileNotFoundError, ValueError, KeyError):
+            self.dim = None
+            self.model = None
+
+    def _save_info(self):
+        tmp_path = self.info_path.with_name(self.info_path.name + ".tmp")
+        tmp_path.write_text(json.dumps({'dim': self.dim, 'model': self.model}))
+        os.replace(tmp_path, self.info_path)
+
+    @property
+    def rows(self) -> int:
+        self._load_info()
+        if not self.dim or not self.path.exists():
+            return 0
+        return self.path.stat().st_size // (self.dim * np.dtype(self.dtype).itemsize)
+
+    def reset(self, dim: int, model: str):
+        """Start an empty matrix, e.g. after switching embedding models"""
+        self.path.unlink(missing_ok=True)
+        self.dim = dim
+        self.model = model
+        self._save_info()
+
+    def write(self, chunk_ids: Iterable[int], vectors: np.ndarray, model: str):
+        """Store vectors at the rows of their chunk ids, growing the file as needed"""
+        ids = np.fromiter(chunk_ids, dtype='int64')
+        if ids.size == 0:
+            return
+        vectors = np.asarray(vectors, dtype='float32')
+
+        self._load_info()
+        if self.dim is None:
+            self.reset(vectors.shape[1], model)
+        elif self.dim != vectors.shape[1] or self.model != model:
+            raise ValueError(
+                f"Embedding store holds {self.model} ({self.dim}d) vectors; "
+                f"rebuild with re-embedding to switch to {model} ({vectors.shape[1]}d)"
+            )
+
+        required_rows = int(ids.max()) + 1
+        row_bytes = self.dim * np.dtype(self.dtype).itemsize
+        with open(self.path, 'ab') as f:
+            if f.tell() < required_rows * row_bytes:
+                f.truncate(required_rows * row_bytes)
+
+        matrix = np.memmap(self.path, dtype=self.dtype, mode='r+', shape=(required_rows, self.dim))
+        matrix[ids] = vectors.astype(self.dtype)
+        matrix.flush()
+        del matrix
+
+    def read(self, chunk_ids: Iterable[int]) -> np.ndarray:
+        """Fetch float32 vectors for chunk ids; rows are paged in lazily from the memory map"""
+        ids = np.fromiter(chunk_ids, dtype='int64')
+        rows = self.rows
+        if ids.size == 0:
+            return np.zeros((0, self.dim or 0), dtype='float32')
+        if rows == 0 or int(ids.max()) >= rows:
+            raise KeyError("Embedding store does not cover all requested chunk ids")
+
+        matrix = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(rows, self.dim))
+        vectors = np.asarray(matrix[ids], dtype='float32')
+        del matrix
+        return vectors
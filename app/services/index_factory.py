@@ -0,0 +1,162 @@
+import math
+import logging
+from typing import Iterable, Optional, Tuple
+import numpy as np
+import faiss
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FLAT = "flat"
+INDEX_IVF_FLAT = "ivf_flat"
+INDEX_HNSW = "hnsw"
+INDEX_IVF_PQ = "ivf_pq"
+
+INDEX_TYPES = (INDEX_FLAT, INDEX_IVF_FLAT, INDEX_HNSW, INDEX_IVF_PQ)
+IVF_TYPES = (INDEX_IVF_FLAT, INDEX_IVF_PQ)
+
+def _nlist_for(num_vectors: int) -> int:
+    """Number of IVF lists: configured value, or ~4*sqrt(n) capped so every list gets training points"""
+    if settings.IVF_NLIST > 0:
+        return settings.IVF_NLIST
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+def min_training_size(index_type: str) -> int:
+    """
+    Smallest corpus an IVF index is trained on; below it we stay on flat. Centroids trained on
+    a handful of documents partition the corpus poorly, so this is well above what k-means needs.
+    """
+    if index_type == INDEX_IVF_FLAT:
+        return max(settings.IVF_MIN_TRAINING_SIZE, settings.IVF_NLIST * 39)
+    if index_type == INDEX_IVF_PQ:
+        # PQ codebooks need 2^nbits points per sub-quantizer
+        return max(settings.IVF_MIN_TRAINING_SIZE, 2 ** settings.PQ_NBITS, settings.IVF_NLIST * 39)
+    return 0
+
+def build_index(index_type: str, dim: int, training_vectors: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    Create an empty index of the given type, keyed by stable chunk ids.
+    IVF types are trained on training_vectors; if there are too few of them the
+    index falls back to flat so ingestion never fails.
+    IVF stores ids in its inverted lists and is used as is: under IndexIDMap2, remove_ids
+    compacts the id map while IVF keeps its internal ids, so surviving vectors get the
+    wrong chunk ids. Flat and HNSW have no ids of their own and are wrapped.
+    """
+    index = _build_base_index(index_type, dim, training_vectors)
+    if index_type_of(index) in IVF_TYPES:
+        return index
+    return faiss.IndexIDMap2(index)
+
+def _build_base_index(index_type: str, dim: int, training_vectors: Optional[np.ndarray]) -> faiss.Index:
+    index_type = (index_type or INDEX_FLAT).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {index_type}. Supported: {', '.join(INDEX_TYPES)}")
+
+    if index_type == INDEX_FLAT:
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == INDEX_HNSW:
+        index = faiss.IndexHNSWFlat(dim, settings.HNSW_M)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+        return index
+
+    num_vectors = 0 if training_vectors is None else len(training_vectors)
+    if num_vectors == 0 or num_vectors < min_training_size(index_type):
+        logger.warning(f"Only {num_vectors} vectors available to train {index_type}; using flat index instead")
+        return faiss.IndexFlatL2(dim)
+
+    nlist = _nlist_for(num_vectors)
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == INDEX_IVF_FLAT:
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+    else:
+        if dim % settings.PQ_M != 0:
+            raise ValueError(f"PQ_M={settings.PQ_M} must divide the embedding dimension {dim}")
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, settings.PQ_M, settings.PQ_NBITS)
+
+    logger.info(f"Training {index_type} index with nlist={nlist} on {num_vectors} vectors")
+    index.train(np.ascontiguousarray(training_vectors, dtype='float32'))
+    index.nprobe = min(settings.IVF_NPROBE, nlist)
+    return index
+
+def index_type_of(index: faiss.Index) -> str:
+    """Report which of INDEX_TYPES an index (possibly ID-mapped) is"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return INDEX_IVF_PQ
+    if isinstance(index, faiss.IndexIVFFlat):
+        return INDEX_IVF_FLAT
+    if isinstance(index, faiss.IndexHNSW):
+        return INDEX_HNSW
+    return INDEX_FLAT
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """Build per-query search parameters so knobs never mutate the shared index"""
+    index_type = index_type_of(index)
+    if index_type in IVF_TYPES:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = nprobe or settings.IVF_NPROBE
+    elif index_type == INDEX_HNSW:
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search or settings.HNSW_EF_SEARCH
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        params.sel = selector
+    return params
+
+def reconstruct_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read every stored vector back out of an index, returning (ids, vectors): in insertion order
+    for ID-mapped and plain indexes, in id order for IVF
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        ids = faiss.vector_to_array(index.id_map).astype('int64')
+        base = faiss.downcast_index(index.index)
+    elif index_type_of(index) in IVF_TYPES:
+        return _reconstruct_ivf(index)
+    else:
+        ids = np.arange(index.ntotal, dtype='int64')
+        base = index
+
+    if base.ntotal == 0:
+        return ids, np.zeros((0, base.d), dtype='float32')
+
+    return ids, base.reconstruct_n(0, base.ntotal)
+
+def _reconstruct_ivf(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    ids = np.concatenate([
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(ivf.nlist)
+    ] + [np.zeros(0, dtype='int64')]).astype('int64')
+    ids.sort()
+    if ids.size == 0:
+        return ids, np.zeros((0, ivf.d), dtype='float32')
+
+    # A hashtable direct map reconstructs by arbitrary id; dropped again so the index is left as it was
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    try:
+        vectors = ivf.reconstruct_batch(ids)
+    finally:
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    return ids, vectors
+
+def id_selector(ids: Iterable[int], exclude: bool = False) -> faiss.IDSelector:
+    """Selector over chunk ids for SearchParameters; keeps its backing array alive"""
+    id_array = np.fromiter(ids, dtype='int64')
+    batch = faiss.IDSelectorBatch(id_array.size, faiss.swig_ptr(id_array))
+    selector = faiss.IDSelectorNot(batch) if exclude else batch
+    # SWIG does not own these; hold references for as long as the selector lives
+    selector.referenced_objects = [id_array, batch]
+    return selector
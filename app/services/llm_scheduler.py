@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from app.utils.metrics import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded; retry in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+class Overloaded(Exception):
+    """Raised instead of queueing when the LLM is too busy to answer in reasonable time"""
+
+@dataclass
+class TokenBucket:
+    capacity: float
+    refill_per_second: float
+    tokens: float
+    updated_at: float = field(default_factory=time.monotonic)
+
+    def take(self) -> float:
+        """Consume one token; returns 0 on success, otherwise the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second if self.refill_per_second > 0 else float('inf')
+
+@dataclass
+class _Ticket:
+    user_id: Any
+    future: asyncio.Future
+    enqueued_at: float
+    on_position: Optional[Callable[[int], Awaitable[None]]]
+    position: int = 0
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM for this worker. At most max_concurrent generations run
+    at once; waiting requests are queued per user and granted round-robin across users, so one busy
+    user cannot starve the others. Each user also has a token bucket limiting how many generations
+    they may start. Waiters are told their queue position whenever it changes.
+    Load is shed rather than queued without end: a request is refused with Overloaded when
+    shed_queue_depth requests are already waiting, or once it has waited max_queue_wait seconds.
+    Background work (conversation summaries) takes a slot only when no user request is waiting.
+    """
+
+    def __init__(self, max_concurrent: int, user_burst: int, user_rate_per_minute: float,
+                 shed_queue_depth: int = 0, max_queue_wait: float = 0.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.user_burst = user_burst
+        self.user_refill_per_second = user_rate_per_minute / 60
+        self.shed_queue_depth = shed_queue_depth
+        self.max_queue_wait = max_queue_wait
+        self._active = 0
+        self._queues: "OrderedDict[Any, Deque[_Ticket]]" = OrderedDict()
+        self._buckets: Dict[Any, TokenBucket] = {}
+        self._background: Deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _check_rate(self, user_id):
+        if self.user_burst <= 0:
+            return
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_burst, self.user_refill_per_second, self.user_burst)
+            self._buckets[user_id] = bucket
+        retry_after = bucket.take()
+        if retry_after > 0:
+            metrics.increment('llm_scheduler.rate_limited')
+            raise RateLimited(retry_after)
+
+    @asynccontextmanager
+    async def slot(self, user_id, on_position: Optional[Callable[[int], Awaitable[None]]] = None):
+        """
+        Hold one generation slot for the duration of the block; raises RateLimited if the user is
+        over budget and Overloaded if the request is shed
+        """
+        self._check_rate(user_id)
+        await self._acquire(user_id, on_position)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def background_slot(self):
+        """
+        Hold one generation slot for work no user is waiting on. It is granted at the lowest priority,
+        after every queued user request, and is neither rate limited nor shed nor counted in queue depth.
+        """
+        await self._acquire_background()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire_background(self):
+        if self._active < self.max_concurrent and not self._queues:
+            self._active += 1
+            self._publish()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._background.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            elif future in self._background:
+                self._background.remove(future)
+            raise
+
+    async def _acquire(self, user_id, on_position):
+        if self._active < self.max_concurrent and not self._queues:
+            self._active += 1
+            metrics.observe('llm_scheduler.wait', 0.0)
+            self._publish()
+            return
+
+        if self.shed_queue_depth > 0 and self.queue_depth >= self.shed_queue_depth:
+            metrics.increment('llm_scheduler.shed')
+            raise Overloaded(f"{self.queue_depth} requests are already waiting for the LLM")
+
+        ticket = _Ticket(user_id, asyncio.get_running_loop().create_future(), time.perf_counter(), on_position)
+        self._queues.setdefault(user_id, deque()).append(ticket)
+        self._update_positions()
+        self._publish()
+        try:
+            # shield keeps a timeout from cancelling the ticket itself, so a late grant is still seen below
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.max_queue_wait or None)
+        except asyncio.TimeoutError:
+            if not ticket.future.done():
+                self._discard(ticket)
+                ticket.future.cancel()
+                metrics.increment('llm_scheduler.shed')
+                raise Overloaded(f"Waited more than {self.max_queue_wait:g} seconds for the LLM")
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Granted in the same instant we were cancelled: hand the slot on
+                self._release()
+            else:
+                self._discard(ticket)
+            raise
+        metrics.observe('llm_scheduler.wait', time.perf_counter() - ticket.enqueued_at)
+
+    def _release(self):
+        self._active -= 1
+        while self._active < self.max_concurrent and (self._queues or self._background):
+            if self._queues:
+                # Round-robin: serve the user at the head of the rotation, then move them to the back
+                user_id, queue = next(iter(self._queues.items()))
+                future = queue.popleft().future
+                if queue:
+                    self._queues.move_to_end(user_id)
+                else:
+                    del self._queues[user_id]
+            else:
+                future = self._background.popleft()
+            if future.done():
+                continue
+            self._active += 1
+            future.set_result(None)
+        self._update_positions()
+        self._publish()
+
+    def _discard(self, ticket: _Ticket):
+        queue = self._queues.get(ticket.user_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user_id]
+        self._update_positions()
+        self._publish()
+
+    def _update_positions(self):
+        """1-based position of every waiter in the order round-robin would serve them"""
+        position = 0
+        rounds = max((len(queue) for queue in self._queues.values()), default=0)
+        for depth in range(rounds):
+            for queue in self._queues.values():
+                if depth < len(queue):
+                    position += 1
+                    ticket = queue[depth]
+                    if ticket.position != position:
+                        ticket.position = position
+                        if ticket.on_position is not None:
+                            asyncio.ensure_future(self._notify(ticket, position))
+
+    @staticmethod
+    async def _notify(ticket: _Ticket, position: int):
+        # Skip updates that were superseded or arrive after the slot was granted
+        if ticket.future.done() or ticket.position != position:
+            return
+        try:
+            await ticket.on_position(position)
+        except Exception as e:
+            logger.debug(f"Could not send queue position: {e}")
+
+    def _publish(self):
+        metrics.set_gauge('llm_scheduler.queue_depth', self.queue_depth)
+        metrics.set_gauge('llm_scheduler.active', self._active)
+
+llm_scheduler = LLMScheduler(
+    max_concurrent=settings.LLM_MAX_CONCURRENCY,
+    user_burst=settings.LLM_USER_BURST,
+    user_rate_per_minute=settings.LLM_USER_RATE_PER_MINUTE,
+    shed_queue_depth=settings.LOAD_SHED_QUEUE_DEPTH if settings.LOAD_SHED_ENABLED else 0,
+    max_queue_wait=settings.LOAD_SHED_MAX_QUEUE_WAIT if settings.LOAD_SHED_ENABLED else 0.0
+)
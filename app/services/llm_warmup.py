@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+from app.services.ollama_pool import OllamaBackend, OllamaPool, get_ollama_pool, is_backend_failure, keep_alive_value
+from app.utils.metrics import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def _parse_hours(value: str) -> Tuple[int, int]:
+    """'08:00-19:00' -> minutes since midnight for start and end"""
+    def to_minutes(hhmm: str) -> int:
+        hours, minutes = hhmm.strip().split(":")
+        return int(hours) * 60 + int(minutes)
+    start, end = value.split("-")
+    return to_minutes(start), to_minutes(end)
+
+def _parse_weekdays(value: str) -> Set[int]:
+    return {int(day) for day in value.split(",") if day.strip()}
+
+class ModelWarmer:
+    """
+    Keeps MODEL_NAME loaded on every Ollama backend so questions do not pay the model load time.
+    The model is preloaded at startup; during warm hours each backend is checked periodically
+    and either pinged to extend keep_alive or, if Ollama has evicted the model, reloaded.
+    Outside warm hours nothing is sent and keep_alive lets the model unload.
+    Any request that reports a load time above the threshold is recorded as a cold start.
+    """
+
+    def __init__(self, pool: OllamaPool, interval: float, warm_hours: str, warm_weekdays: str,
+                 cold_start_threshold: float, history: int = 50):
+        self.pool = pool
+        self.interval = interval
+        self.warm_start, self.warm_end = _parse_hours(warm_hours)
+        self.warm_weekdays = _parse_weekdays(warm_weekdays)
+        self.cold_start_threshold = cold_start_threshold
+        self.incidents: deque = deque(maxlen=history)
+        self._task: Optional[asyncio.Task] = None
+
+    def in_warm_hours(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now()
+        minutes = now.hour * 60 + now.minute
+        return now.weekday() in self.warm_weekdays and self.warm_start <= minutes < self.warm_end
+
+    def record_load(self, backend_url: str, load_seconds: float, source: str):
+        """Called with Ollama's reported load_duration; slow loads are cold starts"""
+        if load_seconds < self.cold_start_threshold:
+            return
+        metrics.increment('llm.cold_starts')
+        metrics.observe('llm.cold_start_load', load_seconds)
+        self.incidents.append({
+            'time': datetime.utcnow().isoformat(),
+            'backend': backend_url,
+            'load_seconds': round(load_seconds, 2),
+            'source': source,
+            'in_warm_hours': self.in_warm_hours()
+        })
+        logger.warning(f"Cold start on {backend_url} ({source}): model load took {load_seconds:.1f}s")
+
+    async def _is_loaded(self, backend: OllamaBackend) -> bool:
+        response = await backend.client.ps()
+        return any(
+            model.get('name') == settings.MODEL_NAME or model.get('model') == settings.MODEL_NAME
+            for model in response.get('models') or []
+        )
+
+    async def warm(self, backend: OllamaBackend, source: str):
+        """Load the model if needed and extend keep_alive; an empty prompt makes Ollama load without generating"""
+        try:
+            with self.pool.lease(backend):
+                response = await backend.client.generate(
+                    model=settings.MODEL_NAME,
+                    prompt="",
+                    keep_alive=keep_alive_value(settings.LLM_KEEP_ALIVE)
+                )
+        except Exception as e:
+            if is_backend_failure(e):
+                self.pool.mark_failure(backend, e)
+            logger.warning(f"Could not warm {settings.MODEL_NAME} on {backend.url}: {str(e)}")
+            return
+        self.pool.mark_success(backend)
+        load_duration = response.get('load_duration')
+        if load_duration:
+            self.record_load(backend.url, load_duration / 1e9, source)
+
+    async def _check(self, backend: OllamaBackend):
+        try:
+            loaded = await self._is_loaded(backend)
+        except Exception as e:
+            logger.debug(f"Could not list loaded models on {backend.url}: {e}")
+            loaded = False
+        if not loaded:
+            metrics.increment('llm.warm_reloads')
+        await self.warm(backend, "keepalive" if loaded else "reload")
+
+    async def _run(self):
+        if settings.LLM_PRELOAD_ON_STARTUP:
+            await asyncio.gather(*(self.warm(backend, "startup") for backend in self.pool.backends))
+            logger.info(f"Preloaded {settings.MODEL_NAME} on {len(self.pool.backends)} Ollama backend(s)")
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.in_warm_hours():
+                await asyncio.gather(*(self._check(backend) for backend in self.pool.backends))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def status(self) -> Dict:
+        return {
+            'model': settings.MODEL_NAME,
+            'in_warm_hours': self.in_warm_hours(),
+            'cold_starts': list(self.incidents)
+        }
+
+_warmer: Optional[ModelWarmer] = None
+
+def get_model_warmer() -> ModelWarmer:
+    global _warmer
+    if _warmer is None:
+        _warmer = ModelWarmer(
+            get_ollama_pool(),
+            interval=settings.LLM_WARM_INTERVAL,
+            warm_hours=settings.LLM_WARM_HOURS,
+            warm_weekdays=settings.LLM_WARM_WEEKDAYS,
+            cold_start_threshold=settings.LLM_COLD_START_THRESHOLD
+        )
+    return _warmer
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+import httpx
+from ollama import AsyncClient, ResponseError
+from app.utils.metrics import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class OllamaBackend:
+    url: str
+    client: AsyncClient
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    last_error: Optional[str] = None
+    served: int = field(default=0)
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+class NoBackendAvailable(Exception):
+    pass
+
+def keep_alive_value(keep_alive: str) -> Union[str, float]:
+    """Ollama parses a string keep_alive as a Go duration, so a bare number ("-1", "600") is sent as seconds"""
+    try:
+        return float(keep_alive)
+    except ValueError:
+        return keep_alive
+
+def is_backend_failure(error: Exception) -> bool:
+    """
+    Connection errors, timeouts and 5xx mean the backend is unhealthy. A 4xx (context too long,
+    unknown model) means the request itself is bad and would fail on every backend.
+    """
+    if isinstance(error, ResponseError):
+        # Errors reported inside a stream carry no status code (-1)
+        return error.status_code < 0 or error.status_code >= 500
+    return isinstance(error, (NoBackendAvailable, OSError, httpx.TransportError))
+
+class OllamaPool:
+    """
+    Set of Ollama servers behind the chat LLM. Requests go to the available backend with the fewest
+    requests in flight. A backend that fails failure_threshold times in a row, in traffic or in the
+    background health probe, is ejected for eject_seconds; the probe brings it back once it answers.
+    If every backend is ejected, the one that has been out longest is tried anyway.
+    """
+
+    def __init__(self, urls: List[str], probe_interval: float, failure_threshold: int, eject_seconds: float):
+        self.backends = [OllamaBackend(url, AsyncClient(host=url)) for url in urls]
+        self.probe_interval = probe_interval
+        self.failure_threshold = max(1, failure_threshold)
+        self.eject_seconds = eject_seconds
+        self._next = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def pick(self, exclude: tuple = ()) -> OllamaBackend:
+        candidates = [backend for backend in self.backends if backend.url not in exclude]
+        if not candidates:
+            raise NoBackendAvailable("All Ollama backends failed for this request")
+        available = [backend for backend in candidates if backend.available]
+        if not available:
+            return min(candidates, key=lambda backend: backend.ejected_until)
+
+        # Least outstanding requests; rotate the starting point so ties spread evenly
+        self._next = (self._next + 1) % len(available)
+        rotated = available[self._next:] + available[:self._next]
+        return min(rotated, key=lambda backend: backend.outstanding)
+
+    @contextmanager
+    def lease(self, backend: OllamaBackend):
+        backend.outstanding += 1
+        backend.served += 1
+        metrics.set_gauge(f'ollama.outstanding.{backend.url}', backend.outstanding)
+        try:
+            yield backend
+        finally:
+            backend.outstanding -= 1
+            metrics.set_gauge(f'ollama.outstanding.{backend.url}', backend.outstanding)
+
+    def mark_success(self, backend: OllamaBackend):
+        if backend.consecutive_failures or not backend.available:
+            logger.info(f"Ollama backend {backend.url} is healthy again")
+        backend.consecutive_failures = 0
+        backend.ejected_until = 0.0
+        backend.last_error = None
+
+    def mark_failure(self, backend: OllamaBackend, error: Exception):
+        backend.consecutive_failures += 1
+        backend.last_error = str(error)
+        metrics.increment('ollama.backend_failures')
+        if backend.consecutive_failures >= self.failure_threshold and backend.available:
+            backend.ejected_until = time.monotonic() + self.eject_seconds
+            metrics.increment('ollama.backend_ejections')
+            logger.warning(f"Ejecting Ollama backend {backend.url} for {self.eject_seconds}s: {error}")
+
+    async def probe(self, backend: OllamaBackend):
+        try:
+            await asyncio.wait_for(backend.client.ps(), timeout=settings.OLLAMA_PROBE_TIMEOUT)
+        except Exception as e:
+            self.mark_failure(backend, e)
+        else:
+            self.mark_success(backend)
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.gather(*(self.probe(backend) for backend in self.backends))
+            await asyncio.sleep(self.probe_interval)
+
+    def start(self):
+        if self._probe_task is None and len(self.backends) > 1:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    def status(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                'url': backend.url,
+                'available': backend.available,
+                'outstanding': backend.outstanding,
+                'served': backend.served,
+                'consecutive_failures': backend.consecutive_failures,
+                'ejected_for_seconds': round(max(0.0, backend.ejected_until - now), 1),
+                'last_error': backend.last_error
+            }
+            for backend in self.backends
+        ]
+
+_pool: Optional[OllamaPool] = None
+
+def backend_urls() -> List[str]:
+    urls = [url.strip() for url in settings.OLLAMA_BASE_URLS.split(",") if url.strip()]
+    return urls or [settings.OLLAMA_BASE_URL]
+
+def get_ollama_pool() -> OllamaPool:
+    """Process-wide pool shared by every LLMModel"""
+    global _pool
+    if _pool is None:
+        _pool = OllamaPool(
+            backend_urls(),
+            probe_interval=settings.OLLAMA_PROBE_INTERVAL,
+            failure_threshold=settings.OLLAMA_FAILURE_THRESHOLD,
+            eject_seconds=settings.OLLAMA_EJECT_SECONDS
+        )
+    return _pool
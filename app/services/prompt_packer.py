@@ -0,0 +1,59 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from app.services.token_counter import count_tokens
+from app.config import settings
+
+# Chat template wrapping and separators between packed pieces, per piece
+PIECE_OVERHEAD_TOKENS = 4
+
+@dataclass
+class PackedContext:
+    chunks: List[str] = field(default_factory=list)
+    history: List[Dict] = field(default_factory=list)
+    tokens: int = 0
+    dropped_chunks: int = 0
+    dropped_history: int = 0
+
+def prompt_budget() -> int:
+    """Prompt tokens available once the reply's num_predict is reserved out of the context window"""
+    return settings.LLM_CONTEXT_WINDOW - settings.LLM_MAX_OUTPUT_TOKENS
+
+def hit_tokens(hit) -> int:
+    return hit.token_count if hit.token_count is not None else count_tokens(hit.text)
+
+def history_entry_tokens(entry: Dict) -> int:
+    """Tokens of one question/answer turn, cached on the entry so each turn is counted once"""
+    if 'tokens' not in entry:
+        entry['tokens'] = count_tokens(f"User: {entry['question']}\nSage: {entry['answer']}\n\n")
+    return entry['tokens']
+
+def pack_context(fixed_tokens: int, hits: List, history: List[Dict], budget: Optional[int] = None) -> PackedContext:
+    """
+    Fill the prompt budget by priority: the fixed instructions and question (fixed_tokens) first,
+    then retrieved chunks in rank order, then history from the most recent turn backwards.
+    A chunk that does not fit is skipped so a smaller, lower-ranked one can still use the space;
+    history stops at the first turn that does not fit so the kept turns stay contiguous.
+    Hits need text and token_count; token counts recorded at ingestion make this free of tokenization.
+    """
+    remaining = (prompt_budget() if budget is None else budget) - fixed_tokens
+    packed = PackedContext(tokens=fixed_tokens)
+    
+    for hit in hits:
+        tokens = hit_tokens(hit) + PIECE_OVERHEAD_TOKENS
+        if tokens > remaining:
+            packed.dropped_chunks += 1
+            continue
+        packed.chunks.append(hit.text)
+        packed.tokens += tokens
+        remaining -= tokens
+    
+    for position, entry in enumerate(reversed(history)):
+        tokens = history_entry_tokens(entry) + PIECE_OVERHEAD_TOKENS
+        if tokens > remaining:
+            packed.dropped_history = len(history) - position
+            break
+        packed.history.insert(0, entry)
+        packed.tokens += tokens
+        remaining -= tokens
+    
+    return packed
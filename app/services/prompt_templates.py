@@ -0,0 +1,117 @@
+"""
+Prompt assembly for the chat LLM.
+
+The system message is a constant, so every request starts with a byte-identical prefix that
+Ollama can serve from its KV cache. Everything that varies comes after it: earlier turns as
+chat messages (append-only within a session, so they extend the reusable prefix turn by turn),
+then the retrieved documents together with the question in the final user message.
+"""
+from functools import lru_cache
+from typing import Dict, List
+from app.services.token_counter import count_tokens
+
+NO_ANSWER_RESPONSE = (
+    "I cannot find this information in the uploaded documents. Please check if the information "
+    "exists in your documents or upload additional relevant documents."
+)
+
+# Never interpolate anything into this: any change to it invalidates the shared prefix cache
+SYSTEM_PROMPT = (
+    "You are a Document-Based Assistant. Your primary and ONLY function is to provide information "
+    "exclusively from the uploaded documents provided to you. You are strictly forbidden from using "
+    "any external knowledge, training data, or general information not contained in these documents.\n\n"
+
+    "ABSOLUTE RESTRICTIONS:\n"
+    "- ONLY use information explicitly stated in the provided documents\n"
+    "- NEVER provide information from your training data or general knowledge\n"
+    "- NEVER make assumptions, inferences, or educated guesses\n"
+    "- NEVER fill in gaps with external information\n"
+    "- NEVER provide general advice or common knowledge\n\n"
+
+    "WHEN INFORMATION IS NOT AVAILABLE:\n"
+    "If the requested information is not found in the documents, you MUST respond with:\n"
+    "'I cannot find this information in the uploaded documents. Please check if the information "
+    "exists in your documents or upload additional relevant documents.'\n\n"
+
+    "RESPONSE REQUIREMENTS:\n"
+    "- Quote directly from documents when possible\n"
+    "- Always specify which document you're referencing\n"
+    "- Use phrases like: 'According to [Document Name]...' or 'The document states...'\n"
+    "- If information spans multiple documents, cite all relevant sources\n"
+    "- Maintain the exact terminology and phrasing used in the documents\n\n"
+
+    "QUALITY STANDARDS:\n"
+    "- Accuracy: Information must match the documents exactly\n"
+    "- Traceability: Every statement must be traceable to a specific document\n"
+    "- Completeness: Include all relevant information from the documents\n"
+    "- Clarity: Present information in an organized, understandable manner\n\n"
+
+    "HANDLING DIFFERENT DOCUMENT TYPES:\n"
+    "- Technical documents: Use precise technical language as written\n"
+    "- Policies/Procedures: Follow the exact steps and guidelines provided\n"
+    "- Reports/Data: Present findings exactly as documented\n"
+    "- Manuals/Guides: Reference specific sections and instructions\n\n"
+
+    "CONVERSATION CONTINUITY:\n"
+    "- Use chat history to maintain context within the conversation\n"
+    "- Refer back to previously discussed document sections when relevant\n"
+    "- Build upon previous answers only using document information\n\n"
+
+    "DOCUMENT CONTEXT:\n"
+    "The documents for each question are given in the user's message, under DOCUMENT CONTEXT.\n\n"
+
+    "CRITICAL REMINDER:\n"
+    "You are bound by the documents provided to you. If information doesn't exist in these documents, "
+    "you cannot and must not provide it. Your value comes from being a reliable, accurate "
+    "source that users can trust to only give them information from their specific documents."
+)
+
+NO_CONTEXT_TEXT = "(No relevant content found in the knowledge base for your question)"
+
+EXCERPTS_INTRO = (
+    "The assistant is under heavy load and cannot write a full answer right now. "
+    "These are the most relevant excerpts from your documents:"
+)
+
+@lru_cache(maxsize=1)
+def static_prompt_tokens() -> int:
+    """Tokens of the constant system message, counted once per process"""
+    return count_tokens(SYSTEM_PROMPT)
+
+def question_message(context_chunks: List[str], question: str) -> str:
+    context_text = "\n\n".join(context_chunks) if context_chunks else NO_CONTEXT_TEXT
+    return (
+        "DOCUMENT CONTEXT:\n"
+        f"{context_text}\n\n"
+        f"User's Question: {question}"
+    )
+
+def summary_message(summary: str) -> str:
+    return f"SUMMARY OF THE EARLIER CONVERSATION:\n{summary}"
+
+def build_messages(context_chunks: List[str], history: List[Dict], question: str, summary: str = "") -> List[Dict]:
+    """Static system prefix, then the conversation summary and history turns oldest first, then documents and question"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if summary:
+        messages.append({"role": "system", "content": summary_message(summary)})
+    for entry in history:
+        messages.append({"role": "user", "content": entry['question']})
+        messages.append({"role": "assistant", "content": entry['answer']})
+    messages.append({"role": "user", "content": question_message(context_chunks, question)})
+    return messages
+
+def excerpts_answer(hits, max_excerpts: int, max_chars: int) -> str:
+    """Retrieval-only answer used when the LLM is shed: the top hits quoted with filename and page"""
+    if not hits:
+        return NO_ANSWER_RESPONSE
+    parts = [EXCERPTS_INTRO]
+    for number, hit in enumerate(hits[:max_excerpts], start=1):
+        source = hit.filename or "Unknown document"
+        # Only PDFs have pages; PyPDFLoader numbers them from 0
+        if hit.page is not None and source.lower().endswith(".pdf"):
+            source += f", page {hit.page + 1}"
+        text = " ".join(hit.text.split())
+        if len(text) > max_chars:
+            text = text[:max_chars].rsplit(" ", 1)[0] + "..."
+        parts.append(f"**{number}. {source}**\n{text}")
+    return "\n\n".join(parts)
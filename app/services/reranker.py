@@ -0,0 +1,57 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import torch
+from sentence_transformers import CrossEncoder
+from app.services.embedding_cache import normalize_query
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class Reranker:
+    """
+    Cross-encoder that rescores retrieval candidates against the query.
+    All uncached (query, chunk) pairs of a call go through the model in one batched forward pass.
+    Scores are cached by normalized query and chunk id; chunk ids are never reused, so entries stay valid.
+    """
+
+    def __init__(self, model_name: str, cache_size: int, max_length: int = 512):
+        self.model = CrossEncoder(
+            model_name,
+            max_length=max_length,
+            device="cuda" if torch.cuda.is_available() else "cpu"
+        )
+        self.cache_size = max(0, cache_size)
+        self._scores: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        logger.info(f"Loaded rerank model {model_name}")
+
+    def score(self, query: str, hits: List[Any]) -> List[float]:
+        """Relevance score for each hit (anything with chunk_id and text), in input order"""
+        query_key = normalize_query(query)
+        scores: Dict[int, float] = {}
+        with self._lock:
+            for hit in hits:
+                cached = self._scores.get((query_key, hit.chunk_id))
+                if cached is not None:
+                    self._scores.move_to_end((query_key, hit.chunk_id))
+                    scores[hit.chunk_id] = cached
+
+        misses = [hit for hit in hits if hit.chunk_id not in scores]
+        metrics.increment('rerank.cache_hits', len(hits) - len(misses))
+        if misses:
+            predicted = self.model.predict(
+                [(query, hit.text) for hit in misses],
+                batch_size=len(misses),
+                show_progress_bar=False
+            )
+            with self._lock:
+                for hit, value in zip(misses, predicted):
+                    scores[hit.chunk_id] = float(value)
+                    if self.cache_size:
+                        self._scores[(query_key, hit.chunk_id)] = float(value)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+
+        return [scores[hit.chunk_id] for hit in hits]
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class RetrievalBatcher:
+    """
+    Coalesces concurrent retrieval requests into micro-batches so the embedding model
+    runs one forward pass and FAISS one search call per batch instead of per question.
+    A batch is flushed when it reaches max_batch_size or max_wait seconds after its first
+    request arrived; run_batch executes in the given executor and must return one result
+    per request, in order.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], executor: Executor,
+                 max_batch_size: int, max_wait: float):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(self, request: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the store outlived a previous event loop
+            self._loop = loop
+            self._pending = []
+            self._flush_handle = None
+
+        future = loop.create_future()
+        self._pending.append((request, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if self._pending:
+            self._flush_handle = self._loop.call_later(self.max_wait, self._flush)
+        if not batch:
+            return
+
+        requests = [request for request, _ in batch]
+        futures = [future for _, future in batch]
+        task = self._loop.run_in_executor(self.executor, self.run_batch, requests)
+        task.add_done_callback(lambda done: self._resolve(done, futures))
+
+    @staticmethod
+    def _resolve(done: asyncio.Future, futures: List[asyncio.Future]):
+        if done.exception() is not None:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(done.exception())
+            return
+
+        for future, result in zip(futures, done.result()):
+            if not future.done():
+                future.set_result(result)
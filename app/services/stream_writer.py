@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+import orjson
+from fastapi import WebSocket
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMAT_JSON = "json"
+STREAM_FORMAT_BINARY = "binary"
+STREAM_FORMATS = (STREAM_FORMAT_JSON, STREAM_FORMAT_BINARY)
+
+# Binary frames are one type byte followed by the UTF-8 payload
+FRAME_TOKENS = b"\x01"
+
+def encode_frame(payload: dict) -> str:
+    """Serialize a websocket JSON frame; orjson is several times faster than json.dumps"""
+    return orjson.dumps(payload).decode()
+
+class TokenStreamWriter:
+    """
+    Coalesces streamed LLM tokens into fewer websocket frames. The first token goes out at once
+    so time-to-first-token is unchanged; after that tokens are buffered and flushed when
+    flush_interval seconds have passed since the buffer started or it reaches max_bytes.
+    In binary format a frame carries the raw UTF-8 text behind a one-byte type tag, with no JSON at all.
+    """
+
+    def __init__(self, websocket: WebSocket, stream_format: str, flush_interval: float, max_bytes: int):
+        self.websocket = websocket
+        self.binary = stream_format == STREAM_FORMAT_BINARY
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self._buffer: List[str] = []
+        self._written: List[str] = []
+        self._buffered_bytes = 0
+        self._buffer_started_at = 0.0
+        self._first_sent = False
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._send_lock = asyncio.Lock()
+        self._closed = False
+
+    @property
+    def text(self) -> str:
+        """Everything written so far, e.g. the partial answer of a cancelled generation"""
+        return "".join(self._written)
+
+    async def write(self, token: str) -> bool:
+        """Queue a token; returns False once the client is gone so the LLM stream can stop"""
+        if self._closed:
+            return False
+        if not token:
+            return True
+
+        self._written.append(token)
+        self._buffer.append(token)
+        self._buffered_bytes += len(token)
+        if not self._first_sent:
+            self._first_sent = True
+            return await self.flush()
+
+        now = time.perf_counter()
+        if len(self._buffer) == 1:
+            self._buffer_started_at = now
+            # Make sure a pause in generation cannot strand buffered text
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_soon)
+        if self._buffered_bytes >= self.max_bytes or now - self._buffer_started_at >= self.flush_interval:
+            return await self.flush()
+        return True
+
+    def _flush_soon(self):
+        self._flush_timer = None
+        if self._buffer and not self._closed:
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> bool:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._buffer or self._closed:
+            return not self._closed
+
+        text = "".join(self._buffer)
+        tokens = len(self._buffer)
+        self._buffer = []
+        self._buffered_bytes = 0
+
+        try:
+            async with self._send_lock:
+                if self.websocket.client_state.name != 'CONNECTED':
+                    self._closed = True
+                    return False
+                if self.binary:
+                    await self.websocket.send_bytes(FRAME_TOKENS + text.encode())
+                else:
+                    await self.websocket.send_text(encode_frame({"status": "streaming", "token": text}))
+        except Exception as e:
+            logger.error(f"Error sending token: {e}")
+            self._closed = True
+            return False
+
+        metrics.increment('websocket.stream_frames')
+        metrics.increment('websocket.stream_tokens', tokens)
+        return True
+
+    async def close(self) -> bool:
+        """Flush whatever is still buffered; call before sending the completion frame"""
+        sent = await self.flush()
+        self._closed = True
+        return sent
@@ -0,0 +1,32 @@
+import logging
+from functools import lru_cache
+from typing import List, Optional
+from tokenizers import Tokenizer
+from app.utils.helpers import estimate_tokens
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=1)
+def get_tokenizer() -> Optional[Tokenizer]:
+    """Load the LLM's tokenizer once per process; None if it cannot be loaded (counts fall back to an estimate)"""
+    try:
+        tokenizer = Tokenizer.from_pretrained(settings.TOKENIZER_MODEL)
+        logger.info(f"Loaded tokenizer {settings.TOKENIZER_MODEL}")
+        return tokenizer
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer {settings.TOKENIZER_MODEL}, estimating token counts: {str(e)}")
+        return None
+
+def count_tokens(text: str) -> int:
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Token counts for many texts in one call; the Rust tokenizer encodes them in parallel"""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return [estimate_tokens(text) for text in texts]
+    return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
@@ -29,6 +29,10 @@ class Timer:
         self.end = time.time()
         self.interval = int(round(self.end - self.start, 0))
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count for logging (about four characters per token)."""
+    return (len(text) + 3) // 4
+
 def validate_file_extension(filename: str, allowed_extensions: list) -> bool:
     """Validate if file extension is allowed."""
     if not filename:
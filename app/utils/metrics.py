@@ -0,0 +1,52 @@
+import threading
+from collections import deque
+from typing import Dict, Any
+
+class Metrics:
+    """Thread-safe in-process counters and timings for the admin status endpoint."""
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, Dict[str, Any]] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration in seconds"""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = {'count': 0, 'total': 0.0, 'max': 0.0, 'recent': deque(maxlen=self._window)}
+                self._timings[name] = timing
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+            timing['recent'].append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {}
+            for name, timing in self._timings.items():
+                recent = sorted(timing['recent'])
+                timings[name] = {
+                    'count': timing['count'],
+                    'avg_ms': round(timing['total'] / timing['count'] * 1000, 2),
+                    'max_ms': round(timing['max'] * 1000, 2),
+                    'p50_ms': round(recent[len(recent) // 2] * 1000, 2),
+                    'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2)
+                }
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': timings
+            }
+
+metrics = Metrics()
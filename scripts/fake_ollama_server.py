@@ -0,0 +1,122 @@
+"""
+Minimal stand-in for an Ollama server, for exercising the backend pool without GPUs.
+
+Run several on different ports and point OLLAMA_BASE_URLS at them, e.g.
+
+    python scripts/fake_ollama_server.py --port 11501
+    python scripts/fake_ollama_server.py --port 11502 --fail-after 20
+
+--fail-after drops the connection after that many streamed tokens (mid-answer failover),
+--fail-rate makes that fraction of requests fail outright, and --down makes /api/ps fail so
+the health probe ejects the backend. Requests for any model other than --model get a 404,
+as from a real server that has not pulled it. /api/generate with an empty prompt loads the
+model like Ollama does for the warmer; the first load reports --load-seconds as load_duration.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+
+parser = argparse.ArgumentParser(description="Fake Ollama server")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=11501)
+parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+parser.add_argument("--tokens", type=int, default=60, help="tokens per answer")
+parser.add_argument("--fail-after", type=int, default=0, help="drop the stream after N tokens (0 = never)")
+parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of chat requests that fail with 500")
+parser.add_argument("--down", action="store_true", help="fail health probes")
+parser.add_argument("--model", default=settings.MODEL_NAME, help="the only model this server knows")
+parser.add_argument("--load-seconds", type=float, default=0.0, help="load_duration reported by the first load")
+args = parser.parse_args()
+
+app = FastAPI()
+loaded = False
+
+def _load_duration() -> int:
+    """Nanoseconds spent loading the model for this request; only the first one pays"""
+    global loaded
+    if loaded:
+        return 0
+    loaded = True
+    return int(args.load_seconds * 1e9)
+
+def _answer_tokens(messages):
+    # Continue an assistant prefix the way Ollama does, so failover output stays coherent
+    prefix = messages[-1]["content"] if messages and messages[-1]["role"] == "assistant" else ""
+    already = len(prefix.split())
+    return [f"word{i} " for i in range(already, args.tokens)]
+
+def _model_not_found(model: str) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"error": f"model '{model}' not found"})
+
+def _chunk(content: str, done: bool = False, **extra) -> bytes:
+    body = {
+        "model": args.model,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "message": {"role": "assistant", "content": content},
+        "done": done,
+        **extra
+    }
+    return (json.dumps(body) + "\n").encode()
+
+@app.get("/api/ps")
+async def ps():
+    if args.down:
+        raise HTTPException(status_code=503, detail="down")
+    return {"models": [{"name": args.model, "model": args.model, "size": 0}]}
+
+@app.get("/api/version")
+async def version():
+    return {"version": "0.0.0-fake"}
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    payload = await request.json()
+    if payload.get("model") != args.model:
+        return _model_not_found(payload.get("model"))
+    if random.random() < args.fail_rate:
+        raise HTTPException(status_code=500, detail="injected failure")
+    return {
+        "model": args.model,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "response": "" if not payload.get("prompt") else "".join(_answer_tokens([])),
+        "done": True,
+        "done_reason": "load" if not payload.get("prompt") else "stop",
+        "load_duration": _load_duration()
+    }
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    payload = await request.json()
+    if payload.get("model") != args.model:
+        return _model_not_found(payload.get("model"))
+    if random.random() < args.fail_rate:
+        raise HTTPException(status_code=500, detail="injected failure")
+    tokens = _answer_tokens(payload.get("messages", []))
+
+    if not payload.get("stream", True):
+        return json.loads(_chunk("".join(tokens), done=True, load_duration=_load_duration(),
+                                 prompt_eval_count=10, prompt_eval_duration=1_000_000))
+
+    async def stream():
+        for sent, token in enumerate(tokens):
+            if args.fail_after and sent >= args.fail_after:
+                raise RuntimeError("injected mid-stream failure")
+            await asyncio.sleep(args.token_delay)
+            yield _chunk(token)
+        yield _chunk("", done=True, load_duration=_load_duration(), prompt_eval_count=10, prompt_eval_duration=1_000_000)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
@@ -161,6 +161,12 @@ function setupChatEventListeners() {
         sendBtn.addEventListener('click', sendMessage);
     }
     
+    document.addEventListener('keydown', (event) => {
+        if (event.key === 'Escape') {
+            cancelGeneration();
+        }
+    });
+    
     window.addEventListener('beforeunload', () => {
         if (socket) {
             socket.close();
@@ -388,6 +394,7 @@ function connectWebSocket() {
     
     console.log('Connecting to WebSocket:', wsUrl);
     socket = new WebSocket(wsUrl);
+    socket.binaryType = 'arraybuffer';
     
     socket.onopen = function(event) {
         console.log('WebSocket connected');
@@ -399,6 +406,10 @@ function connectWebSocket() {
     
     socket.onmessage = function(event) {
         try {
+            if (event.data instanceof ArrayBuffer) {
+                handleBinaryFrame(event.data);
+                return;
+            }
             const data = JSON.parse(event.data);
             handleWebSocketMessage(data);
         } catch (error) {
@@ -448,13 +459,25 @@ function initializeWebSocketSession() {
     }
     
     const initMessage = {
-        session_id: currentSessionId
+        session_id: currentSessionId,
+        stream_format: 'binary'
     };
     
     console.log('Sending WebSocket init message:', initMessage);
     socket.send(JSON.stringify(initMessage));
 }
 
+// Binary frames: one type byte, then UTF-8 text. Type 1 carries streamed answer tokens.
+const FRAME_TOKENS = 1;
+const frameDecoder = new TextDecoder();
+
+function handleBinaryFrame(buffer) {
+    const bytes = new Uint8Array(buffer);
+    if (bytes.length > 0 && bytes[0] === FRAME_TOKENS) {
+        appendToCurrentMessage(frameDecoder.decode(bytes.subarray(1)));
+    }
+}
+
 function handleWebSocketMessage(data) {
     console.log('WebSocket message:', data);
     
@@ -474,12 +497,19 @@ function handleWebSocketMessage(data) {
             updateChatStatus(data.message || 'Searching knowledge base...');
             break;
             
+        case 'queued':
+            updateChatStatus(`Waiting for the assistant (position ${data.position} in queue)...`);
+            break;
+            
         case 'streaming':
             appendToCurrentMessage(data.token);
             break;
             
         case 'complete':
             completeCurrentMessage(data.answer);
+            if (data.degraded) {
+                showAlert('The assistant is busy, so this answer lists the most relevant excerpts instead.', 'warning');
+            }
             updateChatStatus('Ready to chat with knowledge base');
             enableChatInput();
             
@@ -541,6 +571,17 @@ function sendMessage() {
     }
 }
 
+function cancelGeneration() {
+    // Stops the answer being streamed; the server keeps and saves what was generated so far
+    if (!document.getElementById('current-streaming-message')) {
+        return;
+    }
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'cancel' }));
+        updateChatStatus('Stopping...');
+    }
+}
+
 function handleKeyPress(event) {
     if (event.key === 'Enter' && !event.shiftKey) {
         event.preventDefault();
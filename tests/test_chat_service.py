@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# chat_service pulls in the document store and with it the embedding stack
+pytest.importorskip("torch")
+pytest.importorskip("langchain_huggingface")
+
+from app.database import Base
+from app.models.chat import ChatMessage
+from app.models.user import User
+from app.services.chat_service import ChatService, recent_turns_cache
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add(User(email="ada@example.com", username="ada", full_name="Ada", hashed_password="x"))
+    session.commit()
+    yield session
+    session.close()
+    recent_turns_cache._entries.clear()
+
+def questions(turns):
+    return [turn['question'] for turn in turns]
+
+def test_recent_turns_are_cached_until_a_new_message(db):
+    service = ChatService(db)
+    session = service.create_session(1)
+    service.save_message(session.id, "q1", "a1", 10)
+    service.save_message(session.id, "q2", "a2", 10)
+
+    assert questions(service.get_recent_turns(session.id, 4)) == ["q1", "q2"]
+    latest = db.query(ChatMessage).order_by(ChatMessage.id.desc()).first().id
+    assert questions(recent_turns_cache.get(session.id, 4, latest)) == ["q1", "q2"]
+
+    service.save_message(session.id, "q3", "a3", 10)
+    assert questions(service.get_recent_turns(session.id, 2)) == ["q2", "q3"]
+
+def test_message_saved_by_another_worker_invalidates_the_cache(db):
+    service = ChatService(db)
+    session = service.create_session(1)
+    service.save_message(session.id, "q1", "a1", 10)
+    assert questions(service.get_recent_turns(session.id, 4)) == ["q1"]
+
+    # Another worker writes straight to the database; this worker's cache never hears of it
+    db.add(ChatMessage(session_id=session.id, message="q2", response="a2"))
+    db.commit()
+
+    assert questions(service.get_recent_turns(session.id, 4)) == ["q1", "q2"]
+
+def test_session_without_messages_has_no_turns(db):
+    service = ChatService(db)
+    session = service.create_session(1)
+    assert service.get_recent_turns(session.id, 4) == []
@@ -0,0 +1,173 @@
+import asyncio
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("torch")
+pytest.importorskip("langchain_huggingface")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.api import chat
+from app.database import Base
+from app.models.user import User
+from app.services.document_store import SearchHit, SearchResult
+from app.services.ollama_pool import NoBackendAvailable
+from ollama import ResponseError
+
+class FakeDocumentStore:
+    def __init__(self, total_chunks):
+        self.total_chunks = total_chunks
+
+    def get_knowledge_base_status(self):
+        return {'total_documents': 1, 'completed_documents': 1, 'total_chunks': self.total_chunks}
+
+class RetrievingDocumentStore(FakeDocumentStore):
+    """Answers every question with one confident hit; embed_query waits for before_embedding when set"""
+    kb_version = 1
+
+    def __init__(self, total_chunks=10):
+        super().__init__(total_chunks)
+        self.before_embedding = None
+
+    async def embed_query(self, question):
+        if self.before_embedding is not None:
+            await self.before_embedding()
+        return np.ones(4, dtype='float32')
+
+    async def search(self, question, k, chunk_filter=None, query_embedding=None):
+        return SearchResult(hits=[SearchHit(1, "doc", "manual.pdf", 0, "Warranty lasts two years.", None, 6)])
+
+@pytest.fixture
+def make_client(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+    db = SessionLocal()
+    db.add(User(email="ada@example.com", username="ada", full_name="Ada", hashed_password="x"))
+    db.commit()
+    db.close()
+
+    def get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def factory(total_chunks=10):
+        monkeypatch.setattr(chat, "get_db", get_db)
+        monkeypatch.setattr(chat, "verify_token", lambda token: "ada" if token == "good" else None)
+        monkeypatch.setattr(chat, "get_document_store", lambda: FakeDocumentStore(total_chunks))
+        app = FastAPI()
+        app.include_router(chat.router)
+        return TestClient(app)
+
+    return factory
+
+def test_websocket_init_creates_session(make_client):
+    with make_client().websocket_connect("/chat/ws/good") as websocket:
+        websocket.send_json({})
+        frame = websocket.receive_json()
+    assert frame["status"] == "initialized"
+    assert frame["session_id"]
+    assert frame["knowledge_base_status"]["total_chunks"] == 10
+
+def test_websocket_init_with_empty_knowledge_base(make_client):
+    with make_client(total_chunks=0).websocket_connect("/chat/ws/good") as websocket:
+        websocket.send_json({})
+        frame = websocket.receive_json()
+    assert frame["status"] == "error"
+    assert "empty" in frame["error"]
+
+def test_websocket_rejects_invalid_token(make_client):
+    with make_client().websocket_connect("/chat/ws/bad") as websocket:
+        frame = websocket.receive_json()
+    assert frame == {"status": "error", "error": "Invalid token"}
+
+@pytest.fixture
+def answering_client(make_client, monkeypatch):
+    """Client whose questions reach the LLM; returns (client, document store, generations)"""
+    store = RetrievingDocumentStore()
+    generations = []
+
+    def factory(stream_chat):
+        async def recording_stream_chat(messages, callback=None):
+            generations.append(messages)
+            return await stream_chat(messages, callback)
+
+        client = make_client()
+        monkeypatch.setattr(chat, "get_document_store", lambda: store)
+        monkeypatch.setattr(chat, "static_prompt_tokens", lambda: 0)
+        monkeypatch.setattr(chat, "count_tokens", len)
+        monkeypatch.setattr(chat.llm_model, "stream_chat", recording_stream_chat)
+        monkeypatch.setattr(chat.answer_cache, "store", lambda *args: None)
+        return client, store, generations
+
+    return factory
+
+def ask(client, question, *follow_up):
+    """Send a question (and any follow-up messages) and return the final frame"""
+    with client.websocket_connect("/chat/ws/good") as websocket:
+        websocket.send_json({})
+        assert websocket.receive_json()["status"] == "initialized"
+        websocket.send_json({"question": question})
+        for message in follow_up:
+            websocket.send_json(message)
+        frame = websocket.receive_json()
+        while frame["status"] not in ("complete", "error"):
+            frame = websocket.receive_json()
+    return frame
+
+def test_websocket_cancel_before_first_token_skips_generation(answering_client, monkeypatch):
+    async def stream_chat(messages, callback=None):
+        return "never streamed"
+
+    client, store, generations = answering_client(stream_chat)
+    cancel_seen = None
+    is_cancel_message = chat._is_cancel_message
+
+    def spy_is_cancel_message(data):
+        cancelled = is_cancel_message(data)
+        if cancelled:
+            cancel_seen.set()
+        return cancelled
+
+    async def until_cancel_seen():
+        nonlocal cancel_seen
+        cancel_seen = asyncio.Event()
+        # Still embedding when the stop arrives
+        await cancel_seen.wait()
+
+    store.before_embedding = until_cancel_seen
+    monkeypatch.setattr(chat, "_is_cancel_message", spy_is_cancel_message)
+
+    frame = ask(client, "How long is the warranty?", {"type": "cancel"})
+
+    assert frame["cancelled"] is True
+    assert frame["answer"] == ""
+    assert generations == []
+
+def test_websocket_answers_with_excerpts_when_every_backend_is_down(answering_client):
+    async def stream_chat(messages, callback=None):
+        raise NoBackendAvailable("Error in Ollama streaming: connection refused")
+
+    client, _, _ = answering_client(stream_chat)
+    frame = ask(client, "How long is the warranty?")
+
+    assert frame["status"] == "complete"
+    assert frame["degraded"] is True
+    assert "Warranty lasts two years." in frame["answer"]
+
+def test_websocket_reports_a_rejected_request_instead_of_excerpts(answering_client):
+    async def stream_chat(messages, callback=None):
+        raise ResponseError("model 'llama' not found", 404)
+
+    client, _, _ = answering_client(stream_chat)
+    frame = ask(client, "How long is the warranty?")
+
+    assert frame["status"] == "error"
+    assert "not found" in frame["error"]
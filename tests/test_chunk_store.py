@@ -0,0 +1,69 @@
+import time
+import numpy as np
+import pytest
+from app.services.chunk_store import ChunkStore, _query_terms
+
+NUM_CHUNKS = 100_000
+TOKENS_PER_CHUNK = 120
+NEEDLE_ID = 4242
+STOPWORDS = (
+    "the of and to a in is that for it as was with be by on not he i this are or his from at which "
+    "but have an they you were her she there one all we their has been if more when will would who "
+    "so no what how does do can"
+).split()
+
+@pytest.fixture(scope="module")
+def large_store(tmp_path_factory):
+    """100k chunks / 12M tokens: a Zipf-distributed vocabulary with 40% stopwords"""
+    rng = np.random.default_rng(0)
+    vocabulary = np.array([f"term{i}" for i in range(50_000)])
+    stopwords = np.array(STOPWORDS)
+    store = ChunkStore(tmp_path_factory.mktemp("chunks"))
+    batch = 10_000
+    with store.transaction():
+        for start in range(0, NUM_CHUNKS, batch):
+            words = vocabulary[np.minimum(rng.zipf(1.3, (batch, TOKENS_PER_CHUNK)) - 1, len(vocabulary) - 1)]
+            words = np.where(
+                rng.random((batch, TOKENS_PER_CHUNK)) < 0.4,
+                stopwords[rng.integers(0, len(stopwords), (batch, TOKENS_PER_CHUNK))],
+                words
+            )
+            rows = []
+            for offset, row in enumerate(words):
+                chunk_id = start + offset
+                text = " ".join(row.tolist())
+                if chunk_id == NEEDLE_ID:
+                    text += " warranty policy for part w1234"
+                rows.append({
+                    'chunk_id': chunk_id,
+                    'document_id': f"doc{chunk_id // 50}",
+                    'filename': "manual.pdf",
+                    'page': 0,
+                    'chunk_index': offset,
+                    'text': text
+                })
+            store.add_chunks(rows)
+    return store
+
+def test_query_terms_drop_stopwords_and_cap_count():
+    assert _query_terms("What is the warranty policy for part W1234?", 8) == ["w1234", "warranty", "policy", "part"]
+    assert _query_terms("the of and", 8) == []
+    assert len(_query_terms(" ".join(f"word{i}" for i in range(30)), 8)) == 8
+
+def test_keyword_search_stays_fast_on_a_large_corpus(large_store):
+    question = "What is the warranty policy for part w1234?"
+    large_store.keyword_search(question, 20)
+
+    runs = 5
+    started = time.perf_counter()
+    for _ in range(runs):
+        hits = large_store.keyword_search(question, 20)
+    elapsed_ms = (time.perf_counter() - started) / runs * 1000
+
+    assert hits[0] == NEEDLE_ID
+    # An OR of every question term scored ~400ms here, most of it ranking the stopwords' matches
+    assert elapsed_ms < 50
+
+def test_keyword_search_skips_terms_too_common_to_rank(large_store):
+    assert large_store.keyword_search("what is term0 and term1", 20) == []
+    assert large_store.keyword_search("term0 w1234", 20) == [NEEDLE_ID]
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import zlib
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("langchain_huggingface")
+
+from app.models.document import DocumentStatus
+from app.services import document_store
+from app.services.document_store import DocumentStore, SearchHit, apply_distance_cutoff
+
+DIM = 16
+
+class StubEmbeddings:
+    """Deterministic stand-in for the sentence transformer that records every forward pass"""
+
+    def __init__(self, **kwargs):
+        self.batches = []
+
+    def _vector(self, text):
+        return np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIM).astype('float32')
+
+    def embed_query(self, text):
+        self.batches.append(1)
+        return self._vector(text).tolist()
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [self._vector(text).tolist() for text in texts]
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_store, "HuggingFaceEmbeddings", StubEmbeddings)
+    monkeypatch.setattr(document_store.settings, "RERANK_ENABLED", False)
+    monkeypatch.setattr(document_store.settings, "RETRIEVAL_WORKERS", 1)
+    monkeypatch.setattr(document_store.settings, "EMBEDDING_BATCH_SIZE", 32)
+    monkeypatch.setattr(document_store.settings, "EMBEDDING_BATCH_WAIT_MS", 20)
+    store = DocumentStore(str(tmp_path))
+    texts = [f"chunk about topic {i}" for i in range(20)]
+    with store._writable_snapshot() as snapshot:
+        chunk_ids = store.chunk_store.allocate_chunk_ids(len(texts))
+        vectors = np.array(store.embeddings.embed_documents(texts), dtype='float32')
+        snapshot.index.add_with_ids(vectors, np.array(chunk_ids, dtype='int64'))
+        store.embedding_store.write(chunk_ids, vectors, document_store.settings.EMBEDDINGS_MODEL)
+        store.chunk_store.add_chunks(
+            {'chunk_id': chunk_id, 'document_id': 'doc', 'filename': 'doc.txt', 'page': 0, 'chunk_index': i, 'text': text}
+            for i, (chunk_id, text) in enumerate(zip(chunk_ids, texts))
+        )
+        store.chunk_store.upsert_document('doc', filename='doc.txt', status=DocumentStatus.COMPLETED, chunk_count=len(texts))
+    store.embeddings.batches.clear()
+    yield store
+    store.close()
+
+def hit(chunk_id, distance):
+    return SearchHit(chunk_id, "doc", "doc.pdf", 0, f"chunk {chunk_id}", distance)
+
+def kept_ids(result):
+    return [h.chunk_id for h in result.hits]
+
+def test_cutoff_keeps_hits_within_margin_of_the_best():
+    hits = [hit(1, 0.40), hit(2, 0.50), hit(3, 0.62), hit(4, 0.70), hit(5, 1.20)]
+    result = apply_distance_cutoff(hits, min_hits=1, margin=0.25, absolute=0)
+    assert kept_ids(result) == [1, 2, 3]
+    assert [h.chunk_id for h in result.dropped] == [4, 5]
+
+def test_near_duplicate_best_hit_does_not_drop_relevant_hits():
+    # An FAQ entry that repeats the question sits at almost zero distance
+    hits = [hit(1, 0.001), hit(2, 0.20), hit(3, 0.24), hit(4, 0.90)]
+    result = apply_distance_cutoff(hits, min_hits=1, margin=0.25, absolute=0)
+    assert kept_ids(result) == [1, 2, 3]
+
+def test_absolute_limit_and_min_hits():
+    hits = [hit(1, 0.9), hit(2, 1.0), hit(3, 1.05)]
+    result = apply_distance_cutoff(hits, min_hits=2, margin=0.25, absolute=0.95)
+    assert kept_ids(result) == [1, 2]
+
+def test_hits_without_distance_are_kept():
+    hits = [hit(1, 0.1), hit(2, None), hit(3, 2.0)]
+    result = apply_distance_cutoff(hits, min_hits=0, margin=0.25, absolute=0)
+    assert kept_ids(result) == [1, 2]
+
+def test_concurrent_questions_share_one_embedding_pass(store):
+    async def ask(question):
+        # The chat path: embed for the answer cache lookup, then search with that embedding
+        embedding = await store.embed_query(question)
+        return await store.search(question, k=3, query_embedding=embedding)
+
+    async def ask_all():
+        return await asyncio.gather(*(ask(f"question number {i}") for i in range(10)))
+
+    results = asyncio.run(ask_all())
+
+    assert store.embeddings.batches == [10]
+    assert all(len(result.hits) + len(result.dropped) == 3 for result in results)
+    # Each question is one cache miss and is not looked up a second time for the search
+    assert (store.embedding_cache.misses, store.embedding_cache.hits) == (10, 0)
+
+def test_search_with_an_embedding_matches_search_by_text(store):
+    async def both():
+        embedding = await store.embed_query("chunk about topic 7")
+        return (
+            await store.search("chunk about topic 7", k=3, adaptive=False, query_embedding=embedding),
+            await store.search("chunk about topic 7", k=3, adaptive=False)
+        )
+
+    with_embedding, by_text = asyncio.run(both())
+    assert [h.chunk_id for h in with_embedding.hits] == [h.chunk_id for h in by_text.hits]
+    assert with_embedding.hits[0].text == "chunk about topic 7"
+
+def test_rebuild_keeps_the_migrated_index_type(store, monkeypatch):
+    monkeypatch.setattr(document_store.settings, "INDEX_TYPE", "ivf_flat")
+    store.migrate_index("hnsw")
+
+    result = store.rebuild_index()
+    assert result['index_type'] == "hnsw"
+    assert result['total_vectors'] == 20
+
+    # Changing the setting afterwards still takes effect
+    monkeypatch.setattr(document_store.settings, "INDEX_TYPE", "flat")
+    assert store.rebuild_index()['index_type'] == "flat"
+
+def test_slow_rerank_does_not_block_retrieval(store, monkeypatch):
+    release = threading.Event()
+
+    class StuckReranker:
+        def score(self, query, hits):
+            release.wait(timeout=10)
+            return [0.0] * len(hits)
+
+    monkeypatch.setattr(document_store.settings, "RERANK_TIMEOUT_MS", 50)
+    store.reranker = StuckReranker()
+
+    async def ask_twice():
+        first = await store.search("chunk about topic 3", k=3, adaptive=False)
+        # The first cross-encoder pass is still running; retrieval must not queue behind it
+        second = await asyncio.wait_for(store.search("chunk about topic 5", k=3, adaptive=False), timeout=5)
+        return first, second
+
+    try:
+        first, second = asyncio.run(ask_twice())
+    finally:
+        release.set()
+    assert first.hits[0].text == "chunk about topic 3"
+    assert second.hits[0].text == "chunk about topic 5"
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+import faiss
+from app.services import index_factory
+from app.services.index_factory import (
+    INDEX_FLAT, INDEX_HNSW, INDEX_IVF_FLAT, INDEX_IVF_PQ,
+    build_index, index_type_of, min_training_size, reconstruct_vectors, search_parameters
+)
+
+DIM = 32
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).standard_normal((1500, DIM)).astype('float32')
+
+@pytest.fixture(autouse=True)
+def small_index_settings(monkeypatch):
+    monkeypatch.setattr(index_factory.settings, 'IVF_NLIST', 16)
+    monkeypatch.setattr(index_factory.settings, 'IVF_NPROBE', 16)
+    monkeypatch.setattr(index_factory.settings, 'PQ_M', 8)
+    monkeypatch.setattr(index_factory.settings, 'IVF_MIN_TRAINING_SIZE', 1000)
+
+def search_own_ids(index, vectors, ids):
+    _, I = index.search(vectors, 1, params=search_parameters(index))
+    return I[:, 0]
+
+@pytest.mark.parametrize("index_type", [INDEX_FLAT, INDEX_IVF_FLAT, INDEX_IVF_PQ])
+def test_search_after_delete_returns_surviving_ids(index_type, vectors):
+    ids = np.arange(1000, 2500, dtype='int64')
+    index = build_index(index_type, DIM, vectors)
+    assert index_type_of(index) == index_type
+    index.add_with_ids(vectors, ids)
+
+    index.remove_ids(np.arange(2200, 2300, dtype='int64'))
+
+    assert index.ntotal == 1400
+    survivors = slice(1300, 1400)  # chunk ids 2300-2399, stored after the removed range
+    found = search_own_ids(index, vectors[survivors], ids[survivors])
+    if index_type == INDEX_IVF_PQ:
+        # PQ is lossy, but a surviving vector must still come back under its own id
+        assert (found == ids[survivors]).mean() > 0.9
+    else:
+        assert (found == ids[survivors]).all()
+    assert not np.isin(found, np.arange(2200, 2300)).any()
+
+def test_ivf_is_not_wrapped_in_an_id_map(vectors):
+    index = build_index(INDEX_IVF_FLAT, DIM, vectors)
+    assert not isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+def test_hnsw_is_id_mapped_and_cannot_remove(vectors):
+    index = build_index(INDEX_HNSW, DIM)
+    index.add_with_ids(vectors[:100], np.arange(500, 600, dtype='int64'))
+    assert search_own_ids(index, vectors[:10], None).tolist() == list(range(500, 510))
+    with pytest.raises(RuntimeError):
+        index.remove_ids(np.array([500], dtype='int64'))
+
+def test_reconstruct_ivf_after_delete(vectors):
+    ids = np.arange(1000, 2500, dtype='int64')
+    index = build_index(INDEX_IVF_FLAT, DIM, vectors)
+    index.add_with_ids(vectors, ids)
+    index.remove_ids(np.arange(2200, 2300, dtype='int64'))
+
+    stored_ids, stored_vectors = reconstruct_vectors(index)
+
+    keep = (ids < 2200) | (ids >= 2300)
+    assert stored_ids.tolist() == ids[keep].tolist()
+    assert np.allclose(stored_vectors, vectors[keep])
+    # Reconstruction leaves the index searchable and removable as before
+    index.remove_ids(np.array([1000], dtype='int64'))
+    assert index.ntotal == 1399
+
+def test_ivf_falls_back_to_id_mapped_flat_without_enough_training_data(vectors):
+    index = build_index(INDEX_IVF_FLAT, DIM, vectors[:10])
+    assert index_type_of(index) == INDEX_FLAT
+    index.add_with_ids(vectors[:10], np.arange(100, 110, dtype='int64'))
+    assert search_own_ids(index, vectors[:3], None).tolist() == [100, 101, 102]
+
+def test_ivf_needs_a_realistic_training_set(monkeypatch):
+    monkeypatch.setattr(index_factory.settings, 'IVF_MIN_TRAINING_SIZE', 10000)
+    monkeypatch.setattr(index_factory.settings, 'IVF_NLIST', 0)
+    assert min_training_size(INDEX_IVF_FLAT) == 10000
+    assert min_training_size(INDEX_IVF_PQ) == 10000
+    monkeypatch.setattr(index_factory.settings, 'IVF_NLIST', 1024)
+    assert min_training_size(INDEX_IVF_FLAT) == 1024 * 39
+    assert min_training_size(INDEX_HNSW) == 0
@@ -0,0 +1,47 @@
+import asyncio
+from app.services.llm_scheduler import LLMScheduler
+
+def test_background_work_waits_behind_queued_users():
+    scheduler = LLMScheduler(max_concurrent=1, user_burst=0, user_rate_per_minute=0, shed_queue_depth=1)
+    order = []
+
+    async def user(name):
+        async with scheduler.slot(name):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def summary():
+        async with scheduler.background_slot():
+            order.append("summary")
+
+    async def run():
+        async with scheduler.slot("first"):
+            background = asyncio.create_task(summary())
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(user("second"))
+            await asyncio.sleep(0)
+            # A queued summary neither counts towards shedding nor holds back the user
+            assert scheduler.queue_depth == 1
+        await asyncio.gather(background, waiting)
+
+    asyncio.run(run())
+    assert order == ["second", "summary"]
+    assert scheduler.queue_depth == 0 and scheduler._active == 0
+
+def test_cancelled_background_wait_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrent=1, user_burst=0, user_rate_per_minute=0)
+
+    async def summary():
+        async with scheduler.background_slot():
+            pass
+
+    async def run():
+        async with scheduler.slot("first"):
+            background = asyncio.create_task(summary())
+            await asyncio.sleep(0)
+            background.cancel()
+            await asyncio.sleep(0)
+        return background.cancelled()
+
+    assert asyncio.run(run())
+    assert not scheduler._background and scheduler._active == 0
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import pytest
+from ollama import ResponseError
+from app.models.llm import LLMModel
+from app.services import llm_warmup
+from app.services.llm_warmup import ModelWarmer
+from app.services.ollama_pool import OllamaPool, keep_alive_value
+
+FAKE_SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "fake_ollama_server.py")
+TOKENS = 20
+FULL_ANSWER = "".join(f"word{i} " for i in range(TOKENS))
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_fake_server(*flags):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, FAKE_SERVER, "--host", "127.0.0.1", "--port", str(port),
+         "--token-delay", "0", "--tokens", str(TOKENS), *flags],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/api/version", timeout=1)
+            return process, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    pytest.fail(f"fake Ollama server on {url} did not start")
+
+@pytest.fixture(scope="module")
+def servers():
+    started = {
+        "healthy": start_fake_server(),
+        "failing": start_fake_server("--fail-rate", "1"),
+        "mid_stream": start_fake_server("--fail-after", "5"),
+        "down": start_fake_server("--down"),
+        "cold": start_fake_server("--load-seconds", "5")
+    }
+    yield {name: url for name, (_, url) in started.items()}
+    for process, _ in started.values():
+        process.terminate()
+        process.wait()
+
+def make_llm(*urls) -> LLMModel:
+    llm = LLMModel()
+    llm.pool = OllamaPool(list(urls), probe_interval=60, failure_threshold=2, eject_seconds=60)
+    return llm
+
+def backend(llm, url):
+    return next(b for b in llm.pool.backends if b.url == url)
+
+def test_failing_backend_is_failed_over_and_ejected(servers):
+    llm = make_llm(servers["failing"], servers["healthy"])
+    failing = backend(llm, servers["failing"])
+
+    async def scenario():
+        for _ in range(10):
+            assert await llm.generate_response(MESSAGES) == FULL_ANSWER
+            if not failing.available:
+                break
+        assert not failing.available
+        assert failing.consecutive_failures == 2
+
+        # Once ejected it gets no more traffic
+        served = failing.served
+        for _ in range(3):
+            assert await llm.generate_response(MESSAGES) == FULL_ANSWER
+        assert failing.served == served
+
+    asyncio.run(scenario())
+
+def test_stream_fails_over_mid_answer(servers):
+    llm = make_llm(servers["mid_stream"], servers["healthy"])
+    mid_stream = backend(llm, servers["mid_stream"])
+
+    async def scenario():
+        while mid_stream.served == 0:
+            tokens = []
+
+            async def callback(token):
+                tokens.append(token)
+                return True
+
+            answer = await llm.stream_chat(MESSAGES, callback=callback)
+            # The client sees every token exactly once, across both backends
+            assert answer == "".join(tokens) == FULL_ANSWER
+
+    asyncio.run(scenario())
+    assert mid_stream.consecutive_failures == 1
+    assert backend(llm, servers["healthy"]).consecutive_failures == 0
+
+def test_client_error_is_raised_without_failing_the_backend(servers):
+    llm = make_llm(servers["healthy"], servers["mid_stream"])
+    llm.model_name = "not-pulled"
+
+    with pytest.raises(ResponseError) as raised:
+        asyncio.run(llm.generate_response(MESSAGES))
+    assert raised.value.status_code == 404
+
+    # Not retried on the other backend and nobody is marked unhealthy
+    assert sum(b.served for b in llm.pool.backends) == 1
+    assert all(b.consecutive_failures == 0 and b.available for b in llm.pool.backends)
+
+def test_probe_ejects_a_backend_that_is_down(servers):
+    llm = make_llm(servers["down"], servers["healthy"])
+    down = backend(llm, servers["down"])
+
+    async def probe_twice():
+        for _ in range(2):
+            await asyncio.gather(*(llm.pool.probe(b) for b in llm.pool.backends))
+
+    asyncio.run(probe_twice())
+    assert not down.available
+    assert backend(llm, servers["healthy"]).available
+
+def make_warmer(llm) -> ModelWarmer:
+    return ModelWarmer(llm.pool, interval=60, warm_hours="00:00-23:59", warm_weekdays="0,1,2,3,4,5,6",
+                       cold_start_threshold=1)
+
+def test_warmer_preloads_and_keeps_backends_in_rotation(servers):
+    llm = make_llm(servers["cold"], servers["healthy"])
+    warmer = make_warmer(llm)
+
+    async def scenario():
+        await asyncio.gather(*(warmer.warm(b, "startup") for b in llm.pool.backends))
+        assert all(await asyncio.gather(*(warmer._is_loaded(b) for b in llm.pool.backends)))
+        await asyncio.gather(*(warmer._check(b) for b in llm.pool.backends))
+
+    asyncio.run(scenario())
+    assert all(b.consecutive_failures == 0 and b.available for b in llm.pool.backends)
+    # Only the first load on the cold backend was slow
+    assert [(i['backend'], i['source']) for i in warmer.incidents] == [(servers["cold"], "startup")]
+
+def test_warmer_does_not_eject_backends_for_a_missing_model(servers, monkeypatch):
+    monkeypatch.setattr(llm_warmup.settings, "MODEL_NAME", "not-pulled")
+    llm = make_llm(servers["healthy"])
+    warmer = make_warmer(llm)
+
+    async def warm_repeatedly():
+        for _ in range(3):
+            await warmer.warm(llm.pool.backends[0], "keepalive")
+
+    asyncio.run(warm_repeatedly())
+    assert llm.pool.backends[0].consecutive_failures == 0
+    assert llm.pool.backends[0].available
+
+def test_keep_alive_numbers_are_sent_as_seconds():
+    # Ollama rejects "-1" as a duration string, but reads the number -1 as "stay loaded"
+    assert keep_alive_value("-1") == -1
+    assert keep_alive_value("600") == 600
+    assert keep_alive_value("30m") == "30m"
+    assert keep_alive_value("-1m") == "-1m"